@@ -0,0 +1,69 @@
+import bisect
+
+
+class SymbolThresholds:
+    """ABOVE and BELOW targets for one symbol, each kept sorted with a parallel list of alert ids"""
+
+    __slots__ = ("above_targets", "above_ids", "below_targets", "below_ids")
+
+    def __init__(self):
+        self.above_targets = []
+        self.above_ids = []
+        self.below_targets = []
+        self.below_ids = []
+
+    def _lists(self, condition):
+        if condition == "ABOVE":
+            return self.above_targets, self.above_ids
+        return self.below_targets, self.below_ids
+
+    def triggered(self, price):
+        # ABOVE fires when price >= target: every target up to and including price
+        above = self.above_ids[:bisect.bisect_right(self.above_targets, price)]
+        # BELOW fires when price <= target: every target from price upwards
+        below = self.below_ids[bisect.bisect_left(self.below_targets, price):]
+        return above + below
+
+    def __len__(self):
+        return len(self.above_ids) + len(self.below_ids)
+
+
+class AlertIndex:
+    """Active alerts grouped by symbol so each symbol is priced once and matched with a bisect.
+
+    Rebuilt from the table every alert cycle, so there is nothing to keep in sync with the alert endpoints.
+    """
+
+    def __init__(self):
+        self._by_symbol = {}
+
+    @classmethod
+    def build(cls, rows):
+        """Builds the index from (id, symbol, target_price, condition) rows, sorting each symbol once.
+        Rows without a target or with an unknown condition are skipped, so they never cost a price fetch."""
+        grouped = {}
+        for alert_id, symbol, target_price, condition in rows:
+            if target_price is None or condition not in ("ABOVE", "BELOW"):
+                continue
+            grouped.setdefault((symbol.upper(), condition), []).append((target_price, alert_id))
+
+        index = cls()
+        for (symbol, condition), entries in grouped.items():
+            thresholds = index._by_symbol.setdefault(symbol, SymbolThresholds())
+            targets, ids = thresholds._lists(condition)
+            entries.sort()
+            targets.extend(t for t, _ in entries)
+            ids.extend(i for _, i in entries)
+        return index
+
+    def symbols(self):
+        return list(self._by_symbol)
+
+    def triggered(self, symbol, price):
+        thresholds = self._by_symbol.get(symbol.upper())
+        if thresholds is None:
+            return []
+        return thresholds.triggered(price)
+
+    def __len__(self):
+        return sum(len(t) for t in self._by_symbol.values())
@@ -0,0 +1,101 @@
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# Every worker must sign with the same key. A per-process random key only suits a single dev process, where
+# tokens dying on restart is fine, so it has to be asked for explicitly.
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    if os.getenv("ALLOW_RANDOM_SECRET_KEY", "").lower() not in ("1", "true", "yes"):
+        raise RuntimeError("SECRET_KEY is not set (set ALLOW_RANDOM_SECRET_KEY=1 to use a random one for local dev)")
+    logger.warning("SECRET_KEY is not set, signing tokens with a random key for this process only")
+    SECRET_KEY = secrets.token_hex(32)
+JWT_ALGORITHM = os.getenv("ALGORITHM", "HS256")
+# Access tokens are checked from their claims alone, so this is how long a session outlives a password change
+ACCESS_TOKEN_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 15))
+REFRESH_TOKEN_DAYS = int(os.getenv("REFRESH_TOKEN_DAYS", 7))
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail):
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def password_version(password_hash):
+    """Short keyed digest of the stored password hash; it changes with the password, revoking older tokens"""
+    return hmac.new(SECRET_KEY.encode(), password_hash.encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def _encode(user, token_type, lifetime, version):
+    now = datetime.utcnow()
+    claims = {
+        "sub": str(user["id"]),
+        "email": user["email"],
+        "name": user.get("full_name"),
+        "pwv": version,
+        "type": token_type,
+        "iat": now,
+        "exp": now + lifetime,
+    }
+    return jwt.encode(claims, SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+
+def create_token_pair(user, password_hash):
+    """Signed access and refresh tokens for a user dict with id, email and full_name, bound to its current password"""
+    version = password_version(password_hash)
+    return {
+        "access_token": _encode(user, "access", timedelta(minutes=ACCESS_TOKEN_MINUTES), version),
+        "refresh_token": _encode(user, "refresh", timedelta(days=REFRESH_TOKEN_DAYS), version),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_MINUTES * 60,
+    }
+
+
+def decode_token(token, token_type):
+    """Claims of a valid, unexpired token of the given type, as a user dict; raises 401 otherwise"""
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except JWTError:
+        raise _unauthorized("Invalid or expired token")
+    if claims.get("type") != token_type or not str(claims.get("sub", "")).isdigit():
+        raise _unauthorized("Invalid token")
+    return {"id": int(claims["sub"]), "email": claims.get("email"), "full_name": claims.get("name"),
+            "pwv": claims.get("pwv")}
+
+
+def verify_refresh_token(token, db):
+    """decode_token for a refresh token, then checks the user still exists and the token was issued for its
+    current password, so a password change ends every session at its next refresh. Returns (user dict, User row)."""
+    claims = decode_token(token, "refresh")
+    db_user = db.query(models.User).filter(models.User.id == claims["id"]).first()
+    if db_user is None or not hmac.compare_digest(str(claims["pwv"]), password_version(db_user.password_hash)):
+        raise _unauthorized("Token has been revoked")
+    return {"id": db_user.id, "email": db_user.email, "full_name": db_user.full_name}, db_user
+
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    """Dependency: the caller identified by its access token, from the signature and claims alone"""
+    if credentials is None or credentials.scheme.lower() != "bearer":
+        raise _unauthorized("Not authenticated")
+    return decode_token(credentials.credentials, "access")
+
+
+def require_same_user(user_id, current_user):
+    if current_user["id"] != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed for this user")
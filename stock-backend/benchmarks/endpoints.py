@@ -0,0 +1,288 @@
+"""Offline endpoint benchmark: quote, history, predict, compare, news and an alert cycle against a
+synthetic Yahoo Finance stand-in and a throwaway SQLite database. No network, no Postgres.
+
+Run from stock-backend/:
+    python -m benchmarks.endpoints --iterations 50 --save-baseline benchmarks/baseline.json
+    python -m benchmarks.endpoints --iterations 50 --compare benchmarks/baseline.json
+
+benchmarks/baseline.json is committed; it was produced by the first command (meta.command records it), so
+compare on a similar machine or regenerate it locally before judging a change.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+SYMBOLS = ["AAPL", "MSFT", "GOOGL", "AMZN", "TSLA", "NVDA", "META", "NFLX", "^NSEI", "BTC-USD"]
+PERIOD_ROWS = {"1d": 1, "5d": 5, "1mo": 21, "3mo": 63, "6mo": 126, "1y": 252, "2y": 504, "5y": 1260, "max": 2520}
+HEADLINES = [
+    "{name} beats expectations as quarterly revenue climbs",
+    "Analysts warn {name} faces a difficult year ahead",
+    "{name} shares steady ahead of earnings",
+    "{name} announces record buyback, investors cheer",
+    "Regulators open probe into {name} practices",
+    "{name} unveils new product line",
+    "Why {name} stock fell sharply today",
+    "{name} named a top pick for the coming quarter",
+]
+
+
+# --- Synthetic yfinance ---
+class FakeTicker:
+    """Deterministic stand-in for yf.Ticker; every call sleeps `latency` seconds to mimic the network"""
+
+    latency = 0.0
+    _frames = {}
+
+    def __init__(self, ticker, session=None, **kwargs):
+        self.ticker = ticker.upper()
+        self._seed = sum(ord(c) * (i + 1) for i, c in enumerate(self.ticker))
+
+    def _frame(self):
+        # One full series per symbol, so every period is a consistent tail of the same prices
+        frame = self._frames.get(self.ticker)
+        if frame is not None:
+            return frame
+        rng = np.random.default_rng(self._seed)
+        total = PERIOD_ROWS["max"]
+        close = (50 + self._seed % 400) * np.exp(np.cumsum(rng.normal(0.0003, 0.015, total)))
+        index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=total, name="Date")
+        frame = pd.DataFrame({
+            "Open": close * rng.uniform(0.99, 1.01, total),
+            "High": close * rng.uniform(1.0, 1.02, total),
+            "Low": close * rng.uniform(0.98, 1.0, total),
+            "Close": close,
+            "Volume": rng.integers(1_000_000, 50_000_000, total),
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+        }, index=index)
+        self._frames[self.ticker] = frame
+        return frame
+
+    def history(self, period="1mo", interval="1d", start=None, **kwargs):
+        time.sleep(self.latency)
+        frame = self._frame()
+        if start is not None:
+            return frame[frame.index >= pd.Timestamp(start)].copy()
+        return frame.iloc[-PERIOD_ROWS.get(period, 21):].copy()
+
+    @property
+    def info(self):
+        time.sleep(self.latency)
+        return {
+            "longName": f"{self.ticker} Inc.",
+            "sector": "Technology",
+            "industry": "Software",
+            "marketCap": 10 ** 9 * (1 + self._seed % 2000),
+            "trailingPE": 10 + self._seed % 40,
+            "trailingEps": 1 + self._seed % 12,
+            "beta": 0.5 + (self._seed % 15) / 10,
+            "fiftyTwoWeekHigh": 500.0,
+            "fiftyTwoWeekLow": 50.0,
+            "totalRevenue": 10 ** 8 * (1 + self._seed % 900),
+            "volume": 1_000_000,
+            "longBusinessSummary": f"{self.ticker} is a synthetic company used for benchmarks.",
+            "website": "#",
+        }
+
+    @property
+    def news(self):
+        time.sleep(self.latency)
+        name = self.ticker.lstrip("^")
+        return [{
+            "uuid": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{name}-{i}")),
+            "title": template.format(name=name),
+            "link": "#",
+            "publisher": "Synthetic Wire",
+        } for i, template in enumerate(HEADLINES)]
+
+
+# --- Environment ---
+def prepare_environment(workdir):
+    # Must run before main is imported: the app reads its settings at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["OHLCV_STORE_DIR"] = os.path.join(workdir, "ohlcv")
+    os.environ["MODEL_CACHE_DIR"] = os.path.join(workdir, "models")
+    os.environ["EPHEMERAL_STORE"] = "memory"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.pop("REDIS_URL", None)
+
+    import yfinance as yf
+    yf.Ticker = FakeTicker
+
+
+def seed_database(main, alerts_per_symbol):
+    import models
+    models.Base.metadata.create_all(bind=main.engine)
+    db = main.SessionLocal()
+    try:
+        user = models.User(email="bench@example.com", password_hash="-", full_name="Bench User")
+        db.add(user)
+        db.commit()
+        for symbol in SYMBOLS:
+            price = float(FakeTicker(symbol).history(period="1d")["Close"].iloc[-1])
+            for i in range(alerts_per_symbol):
+                # Targets 1-5% away from the price on the untriggered side; every tenth alert is on the other side
+                above = i % 2 == 1
+                side = 1 if above != (i % 10 == 0) else -1
+                target = price * (1 + side * (0.01 + 0.04 * i / alerts_per_symbol))
+                db.add(models.Alert(user_id=user.id, symbol=symbol, target_price=round(target, 2),
+                                    condition="ABOVE" if above else "BELOW", status="ACTIVE"))
+        db.commit()
+    finally:
+        db.close()
+
+
+def reactivate_alerts(main):
+    import models
+    db = main.SessionLocal()
+    try:
+        db.query(models.Alert).update({models.Alert.status: "ACTIVE"}, synchronize_session=False)
+        db.query(models.EmailOutbox).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+# --- Measurement ---
+def percentile(samples, q):
+    return round(float(np.percentile(samples, q)), 3)
+
+
+def measure(fn, iterations, concurrency, before_each=None):
+    """Runs fn(i) `iterations` times on `concurrency` threads; returns latency samples (ms) and wall time (s)"""
+    def timed(i):
+        started = time.perf_counter()
+        fn(i)
+        return (time.perf_counter() - started) * 1000
+
+    if before_each is not None:
+        # Sequential, and the untimed setup is left out of the throughput
+        samples = []
+        for i in range(iterations):
+            before_each()
+            samples.append(timed(i))
+        return samples, sum(samples) / 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        wall_started = time.perf_counter()
+        samples = list(pool.map(timed, range(iterations)))
+        return samples, time.perf_counter() - wall_started
+
+
+def run_suite(main, iterations, concurrency):
+    symbol = lambda i: SYMBOLS[i % len(SYMBOLS)]
+    cases = {
+        "get_quote": (lambda i: main.get_quote(symbol(i)), None),
+        "get_history": (lambda i: main.get_history(symbol(i), "6mo"), None),
+        "get_history_columnar": (lambda i: main.get_history(symbol(i), "1y", format="columnar"), None),
+        "predict_stock": (lambda i: main.predict_stock(symbol(i)), None),
+        "compare_stocks": (lambda i: main.compare_stocks(symbol(i), symbol(i + 1)), None),
+        "compare_many": (lambda i: main.compare_stocks(symbols=",".join(SYMBOLS[:5])), None),
+        "get_stock_news": (lambda i: main.get_stock_news(symbol(i)), None),
+        # Cycles run one at a time, as in the app; triggered alerts are re-armed (untimed) before each
+        "alert_cycle": (lambda i: main.run_alert_cycle(), lambda: reactivate_alerts(main)),
+    }
+
+    results = {}
+    for name, (fn, before_each) in cases.items():
+        # The first call per symbol pays for cold caches, model training and store backfills
+        cold_started = time.perf_counter()
+        for i in range(len(SYMBOLS) if before_each is None else 1):
+            if before_each:
+                before_each()
+            fn(i)
+        cold_ms = (time.perf_counter() - cold_started) * 1000 / (len(SYMBOLS) if before_each is None else 1)
+
+        samples, wall = measure(fn, iterations, concurrency, before_each)
+        results[name] = {
+            "iterations": iterations,
+            "throughputPerSec": round(iterations / wall, 2) if wall else None,
+            "coldMs": round(cold_ms, 3),
+            "p50Ms": percentile(samples, 50),
+            "p95Ms": percentile(samples, 95),
+            "p99Ms": percentile(samples, 99),
+            "maxMs": round(max(samples), 3),
+        }
+        print(f"{name:22s} {results[name]['throughputPerSec']:>9} req/s   p50 {results[name]['p50Ms']:>9.2f} ms   "
+              f"p95 {results[name]['p95Ms']:>9.2f} ms   p99 {results[name]['p99Ms']:>9.2f} ms   "
+              f"cold {results[name]['coldMs']:>9.2f} ms")
+    return results
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    print(f"\n{'endpoint':22s} {'p95 base':>10s} {'p95 now':>10s} {'change':>8s}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base or not base["p95Ms"]:
+            print(f"{name:22s} {'-':>10s} {current['p95Ms']:>10.2f}      new")
+            continue
+        change = current["p95Ms"] / base["p95Ms"] - 1
+        flag = "  REGRESSION" if change > tolerance else ""
+        print(f"{name:22s} {base['p95Ms']:>10.2f} {current['p95Ms']:>10.2f} {change:>+7.0%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--alerts-per-symbol", type=int, default=20)
+    parser.add_argument("--upstream-latency-ms", type=float, default=0.0,
+                        help="Simulated Yahoo round trip per call; 0 measures our own overhead only")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 growth over the baseline")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="stock-bench-")
+    prepare_environment(workdir)
+    FakeTicker.latency = args.upstream_latency_ms / 1000
+
+    import main as app_main
+    seed_database(app_main, args.alerts_per_symbol)
+
+    try:
+        results = run_suite(app_main, args.iterations, args.concurrency)
+    finally:
+        app_main.shutdown_event()
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "meta": {
+                    "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "command": " ".join(["python -m benchmarks.endpoints"] + sys.argv[1:]),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "iterations": args.iterations,
+                    "concurrency": args.concurrency,
+                    "upstreamLatencyMs": args.upstream_latency_ms,
+                },
+                "results": results,
+            }, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"\np95 regressed more than {args.tolerance:.0%} on: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
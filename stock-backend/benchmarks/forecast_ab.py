@@ -0,0 +1,86 @@
+"""A/B benchmark: per-day predict calls (old predict_stock loop) vs one batched horizon matrix.
+
+Run from stock-backend/:  python -m benchmarks.forecast_ab --repeat 50
+"""
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ml_engine import train_models, predict_horizons
+
+SHORT_TERM_DAYS = list(range(1, 31))
+LONG_TERM_INTERVALS = [30, 180, 365]
+
+
+def synthetic_training_set(days=504, seed=42):
+    rng = np.random.default_rng(seed)
+    start = date.today() - timedelta(days=days)
+    ordinals = np.array([(start + timedelta(days=i)).toordinal() for i in range(days)])
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, days)))
+    return pd.DataFrame({"Date_Ordinal": ordinals}), pd.Series(closes)
+
+
+def forecast_loop(lr_model, rf_model, last_ordinal):
+    # A: what predict_stock used to do, 68 single-row predict calls
+    series = []
+    for i in SHORT_TERM_DAYS:
+        lr_pred = lr_model.predict([[last_ordinal + i]])[0]
+        rf_pred = rf_model.predict([[last_ordinal + i]])[0]
+        series.append((lr_pred * 0.4) + (rf_pred * 0.6))
+    long_term = []
+    for days in LONG_TERM_INTERVALS:
+        lr_pred = lr_model.predict([[last_ordinal + days]])[0]
+        rf_pred = rf_model.predict([[last_ordinal + days]])[0]
+        long_term.append((lr_pred + rf_pred) / 2)
+    tom_lr = lr_model.predict([[last_ordinal + 1]])[0]
+    tom_rf = rf_model.predict([[last_ordinal + 1]])[0]
+    return np.array(series), np.array(long_term), (tom_lr, tom_rf)
+
+
+def forecast_batched(lr_model, rf_model, last_ordinal):
+    # B: one horizon matrix, one predict call per model
+    lr_preds, rf_preds = predict_horizons(lr_model, rf_model, last_ordinal, SHORT_TERM_DAYS + LONG_TERM_INTERVALS)
+    n = len(SHORT_TERM_DAYS)
+    series = (lr_preds[:n] * 0.4) + (rf_preds[:n] * 0.6)
+    long_term = (lr_preds[n:] + rf_preds[n:]) / 2
+    return series, long_term, (lr_preds[0], rf_preds[0])
+
+
+def time_it(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    X, y = synthetic_training_set()
+    lr_model, rf_model = train_models(X, y)
+    last_ordinal = int(X["Date_Ordinal"].iloc[-1])
+
+    # Both paths must produce the same forecast
+    a, b = forecast_loop(lr_model, rf_model, last_ordinal), forecast_batched(lr_model, rf_model, last_ordinal)
+    assert np.allclose(a[0], b[0]) and np.allclose(a[1], b[1]) and np.allclose(a[2], b[2])
+
+    results = {
+        "A loop (68 calls)": time_it(lambda: forecast_loop(lr_model, rf_model, last_ordinal), args.repeat),
+        "B batched (2 calls)": time_it(lambda: forecast_batched(lr_model, rf_model, last_ordinal), args.repeat),
+    }
+    for name, samples in results.items():
+        print(f"{name:22s} median {statistics.median(samples):8.2f} ms   min {min(samples):8.2f} ms")
+    speedup = statistics.median(results["A loop (68 calls)"]) / statistics.median(results["B batched (2 calls)"])
+    print(f"Speedup: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Benchmark: row vs columnar /api/stocks/history payloads for a 5y daily frame.
+
+Run from stock-backend/:  python -m benchmarks.history_format --repeat 20
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from fastapi.encoders import jsonable_encoder
+
+from history_format import history_rows, history_columns
+
+
+def synthetic_history(days=1260, seed=7):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days, name="Date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, days)))
+    hist = pd.DataFrame({
+        "Open": close * rng.uniform(0.99, 1.01, days),
+        "High": close * rng.uniform(1.0, 1.02, days),
+        "Low": close * rng.uniform(0.98, 1.0, days),
+        "Close": close,
+        "Volume": rng.integers(1_000_000, 5_000_000, days),
+    }, index=index)
+    hist['SMA_20'] = hist['Close'].rolling(window=20).mean()
+    hist['SMA_50'] = hist['Close'].rolling(window=50).mean()
+    return hist
+
+
+def rows_payload(hist):
+    # What FastAPI does for the default format: encode every row dict, then dump
+    return json.dumps(jsonable_encoder(history_rows(hist))).encode()
+
+
+def columnar_payload(hist):
+    # JSONResponse path used by ?format=columnar
+    return json.dumps(history_columns(hist)).encode()
+
+
+def measure(fn, hist, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn(hist)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--days", type=int, default=1260)
+    args = parser.parse_args()
+
+    hist = synthetic_history(args.days)
+    for name, fn in [("rows", rows_payload), ("columnar", columnar_payload)]:
+        samples, size = measure(fn, hist, args.repeat)
+        print(f"{name:9s} median {statistics.median(samples):8.2f} ms   payload {size / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
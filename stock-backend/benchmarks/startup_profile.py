@@ -0,0 +1,75 @@
+"""Startup profile: per-package import cost of `import main`, from python -X importtime.
+
+Run from stock-backend/:  python -m benchmarks.startup_profile --top 20 --budget-ms 3000
+Exits non-zero when the total import time is over --budget-ms.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def profile_import(module, env):
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-2000:])
+        raise SystemExit(f"import {module} failed")
+
+    # Lines look like "import time:       self [us] |  cumulative | imported package", nested names are indented
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return modules, wall_ms
+
+
+def package_costs(modules):
+    """Import time per top-level package, summing each module's own (self) time so nesting isn't double counted"""
+    costs = {}
+    for name, self_us, _ in modules:
+        package = name.strip().split(".")[0]
+        costs[package] = costs.get(package, 0) + self_us
+    return sorted(costs.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # Importing the app must not need a reachable database; a local SQLite URL keeps database.py happy
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'startup-profile.db')}")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    env.setdefault("SECRET_KEY", "startup-profile")
+
+    modules, wall_ms = profile_import(args.module, env)
+    total_ms = sum(self_us for _, self_us, _ in modules) / 1000
+
+    print(f"{'package':30s} {'ms':>10s}")
+    for package, cost in package_costs(modules)[:args.top]:
+        print(f"{package:30s} {cost / 1000:>10.1f}")
+
+    heavy = [name.strip() for name, _, _ in modules if name.strip().split(".")[0] in ("sklearn", "textblob", "nltk")]
+    print(f"\n{len(modules)} modules, {total_ms:.0f} ms importing, {wall_ms:.0f} ms process wall time")
+    if heavy:
+        print(f"Heavy ML/NLP modules loaded at import: {len(heavy)} (e.g. {', '.join(heavy[:3])})")
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"Import time {total_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
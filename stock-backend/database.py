@@ -1,11 +1,14 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Get database URL from environment variables
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -20,9 +23,10 @@ try:
     engine = create_engine(
         DATABASE_URL,
         pool_pre_ping=True,
-        echo=True
+        # Per-statement logging is for local debugging only; query timings are in /api/internal/stats
+        echo=os.getenv("SQL_ECHO", "").lower() in ("1", "true", "yes")
     )
-    print("Successfully connected to Supabase PostgreSQL")
+    logger.info("Database engine created")
     
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     Base = declarative_base()
@@ -35,8 +39,5 @@ try:
             db.close()
 
 except Exception as e:
-    print("="*50)
-    print("DATABASE CONNECTION ERROR:")
-    print(f"Error: {str(e)}")
-    print("="*50)
+    logger.critical("DATABASE CONNECTION ERROR: %s", e)
     raise
\ No newline at end of file
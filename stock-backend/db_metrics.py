@@ -0,0 +1,155 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+logger = logging.getLogger(__name__)
+
+# Set by the request middleware; queries run outside a request (alert loop, email outbox) have none
+current_request = contextvars.ContextVar("current_request", default=None)
+
+_route_labels = {}
+
+
+def route_path(scope):
+    """Path template of the matched route, e.g. /api/watchlist/{user_id}, so ids stay out of labels"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    path = _route_labels.get(endpoint)
+    if path is None:
+        path = next((r.path for r in scope["app"].router.routes if getattr(r, "endpoint", None) is endpoint), None)
+        path = _route_labels[endpoint] = path or endpoint.__name__
+    return path
+
+
+def route_label(scope):
+    return f"{scope.get('method')} {route_path(scope)}"
+
+
+class RequestDBUsage:
+    __slots__ = ("scope", "queries", "db_seconds")
+
+    def __init__(self, scope):
+        # The router fills in scope["endpoint"] before the handler runs, so queries can be labelled by route
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+class QueryStats:
+    """Per-endpoint query counts, DB time and latency histograms, collected from SQLAlchemy engine events"""
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_log_size=50):
+        self.slow_query_ms = slow_query_ms
+        self._endpoints = {}
+        self._slow = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        event.listen(engine, "handle_error", self._on_error)
+
+    # --- Engine events ---
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._finish(conn, statement)
+
+    def _on_error(self, context):
+        if context.connection is not None:
+            self._finish(context.connection, context.statement, failed=True)
+
+    def _finish(self, conn, statement, failed=False):
+        started = conn.info.get("query_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        usage = current_request.get()
+        if usage is not None:
+            usage.queries += 1
+            usage.db_seconds += elapsed
+            endpoint = route_label(usage.scope)
+        else:
+            endpoint = "background"
+
+        elapsed_ms = elapsed * 1000
+        slow = elapsed_ms >= self.slow_query_ms
+        with self._lock:
+            entry = self._entry(endpoint)
+            entry["queries"] += 1
+            entry["dbSeconds"] += elapsed
+            entry["errors"] += failed
+            entry["buckets"][self._bucket(elapsed_ms)] += 1
+            if slow:
+                self._slow.append({
+                    "endpoint": endpoint,
+                    "ms": round(elapsed_ms, 1),
+                    "statement": " ".join((statement or "").split())[:300],
+                    "at": time.time(),
+                })
+        if slow:
+            logger.warning("Slow query", extra={"endpoint": endpoint, "ms": round(elapsed_ms, 1),
+                                                "statement": " ".join((statement or "").split())[:300]})
+
+    # --- Requests ---
+    def begin_request(self, scope):
+        usage = RequestDBUsage(scope)
+        return usage, current_request.set(usage)
+
+    def end_request(self, usage, token):
+        current_request.reset(token)
+        if not usage.queries:
+            return
+        with self._lock:
+            entry = self._entry(route_label(usage.scope))
+            entry["requests"] += 1
+            entry["maxQueriesPerRequest"] = max(entry["maxQueriesPerRequest"], usage.queries)
+
+    def _entry(self, endpoint):
+        entry = self._endpoints.get(endpoint)
+        if entry is None:
+            entry = self._endpoints[endpoint] = {
+                "requests": 0, "queries": 0, "errors": 0, "dbSeconds": 0.0,
+                "maxQueriesPerRequest": 0, "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),  # Last slot is +Inf
+            }
+        return entry
+
+    @staticmethod
+    def _bucket(elapsed_ms):
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                return i
+        return len(LATENCY_BUCKETS_MS)
+
+    def snapshot(self):
+        """Raw per-endpoint counters; bucket counts are per bucket (not cumulative), the last one is +Inf"""
+        with self._lock:
+            return {name: dict(entry, buckets=list(entry["buckets"])) for name, entry in self._endpoints.items()}
+
+    def stats(self):
+        labels = [f"le{b}ms" for b in LATENCY_BUCKETS_MS] + ["inf"]
+        endpoints = {}
+        for name, entry in self.snapshot().items():
+            endpoints[name] = {
+                "requests": entry["requests"],
+                "queries": entry["queries"],
+                "errors": entry["errors"],
+                "dbMs": round(entry["dbSeconds"] * 1000, 1),
+                "avgQueryMs": round(entry["dbSeconds"] * 1000 / entry["queries"], 2),
+                "queriesPerRequest": round(entry["queries"] / entry["requests"], 2) if entry["requests"] else None,
+                "maxQueriesPerRequest": entry["maxQueriesPerRequest"],
+                "histogram": dict(zip(labels, entry["buckets"])),
+            }
+        with self._lock:
+            slow = list(self._slow)
+        return {"slowQueryMs": self.slow_query_ms, "endpoints": endpoints, "slowQueries": slow}
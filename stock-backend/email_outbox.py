@@ -0,0 +1,228 @@
+import datetime
+import logging
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+
+import models
+from metrics import EMAIL_SEND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def build_message(from_email, to_email, subject, body):
+    msg = MIMEText(body, 'html' if '<html>' in body else 'plain')
+    msg['Subject'] = subject
+    msg['From'] = from_email
+    msg['To'] = to_email
+    return msg
+
+
+def enqueue_email(db, to_email, subject, body, commit=True):
+    """Adds a message to the outbox table; the sender worker delivers it"""
+    item = models.EmailOutbox(to_email=to_email, subject=subject, body=body, status="PENDING")
+    db.add(item)
+    if commit:
+        db.commit()
+    return item
+
+
+class OutboxSender:
+    """Background worker that drains the email outbox over a reused, authenticated SMTP connection"""
+
+    def __init__(self, session_factory, smtp_server, smtp_port, email_address, email_password,
+                 batch_size=20, poll_interval=2.0, max_attempts=5, backoff_base=30, backoff_max=3600,
+                 idle_timeout=60, claim_timeout=600):
+        self.session_factory = session_factory
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.email_address = email_address
+        self.email_password = email_password
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.idle_timeout = idle_timeout
+        self.claim_timeout = claim_timeout  # A SENDING row older than this lost its sender and is queued again
+
+        self._server = None
+        self._last_used = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.connections_opened = 0
+        self.send_seconds_total = 0.0
+        self.last_batch_size = 0
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._close()
+
+    def notify(self):
+        """Wakes the worker right away instead of waiting for the next poll"""
+        self._wake.set()
+
+    # --- SMTP connection reuse ---
+    def _connect(self):
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
+        server.ehlo()
+        server.starttls()
+        server.ehlo()
+        server.login(self.email_address, self.email_password)
+        self.connections_opened += 1
+        return server
+
+    def _connection(self):
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            # Servers drop idle sessions, check it before trusting it
+            try:
+                if self._server.noop()[0] != 250:
+                    self._close()
+            except OSError:
+                self._close()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def _close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def _send(self, item):
+        msg = build_message(self.email_address, item.to_email, item.subject, item.body)
+        try:
+            self._connection().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # Stale connection, reconnect once and retry the message
+            self._close()
+            self._connection().send_message(msg)
+        self._last_used = time.monotonic()
+
+    # --- Worker loop ---
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.process_batch()
+            except Exception:
+                logger.exception("Email outbox error")
+                self._close()
+                processed = 0
+            if processed < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+            if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                self._close()
+
+    def _claim(self, db, item_id):
+        """Moves one row from PENDING to SENDING and returns it, or None if another sender claimed it first"""
+        claimed = db.query(models.EmailOutbox).filter(
+            models.EmailOutbox.id == item_id,
+            models.EmailOutbox.status == "PENDING"
+        ).update({
+            "status": "SENDING",
+            "next_attempt_at": datetime.datetime.utcnow() + datetime.timedelta(seconds=self.claim_timeout),
+        }, synchronize_session=False)
+        db.commit()
+        if claimed != 1:
+            return None
+        return db.query(models.EmailOutbox).get(item_id)
+
+    def process_batch(self):
+        db = self.session_factory()
+        try:
+            now = datetime.datetime.utcnow()
+            # Rows claimed by a sender that died mid-batch
+            db.query(models.EmailOutbox).filter(
+                models.EmailOutbox.status == "SENDING",
+                models.EmailOutbox.next_attempt_at <= now
+            ).update({"status": "PENDING"}, synchronize_session=False)
+            item_ids = [row.id for row in db.query(models.EmailOutbox.id).filter(
+                models.EmailOutbox.status == "PENDING",
+                models.EmailOutbox.next_attempt_at <= now
+            ).order_by(models.EmailOutbox.id).limit(self.batch_size)]
+            db.commit()
+            self.last_batch_size = len(item_ids)
+
+            for item_id in item_ids:
+                # Every worker may run a sender; the conditional update hands each row to exactly one of them
+                item = self._claim(db, item_id)
+                if item is None:
+                    continue
+                started = time.monotonic()
+                try:
+                    self._send(item)
+                    item.status = "SENT"
+                    item.sent_at = datetime.datetime.utcnow()
+                    elapsed = time.monotonic() - started
+                    EMAIL_SEND_SECONDS.observe(elapsed, "sent")
+                    with self._lock:
+                        self.sent += 1
+                        self.send_seconds_total += elapsed
+                    logger.info("Email sent", extra={"emailId": item.id, "to": item.to_email})
+                except Exception as e:
+                    EMAIL_SEND_SECONDS.observe(time.monotonic() - started, "failed")
+                    self._close()
+                    item.attempts = (item.attempts or 0) + 1
+                    item.last_error = str(e)[:500]
+                    if item.attempts >= self.max_attempts:
+                        item.status = "FAILED"
+                        with self._lock:
+                            self.failed += 1
+                        logger.error("Giving up on email after %d attempts: %s", item.attempts, e,
+                                     extra={"emailId": item.id, "to": item.to_email})
+                    else:
+                        delay = min(self.backoff_max, self.backoff_base * 2 ** (item.attempts - 1))
+                        item.status = "PENDING"
+                        item.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+                        with self._lock:
+                            self.retried += 1
+                        logger.warning("Email failed, retrying in %ds: %s", delay, e,
+                                       extra={"emailId": item.id, "to": item.to_email})
+                db.commit()
+            return len(item_ids)
+        finally:
+            db.close()
+
+    def stats(self):
+        db = self.session_factory()
+        try:
+            pending = db.query(models.EmailOutbox).filter(models.EmailOutbox.status == "PENDING").count()
+            failed_rows = db.query(models.EmailOutbox).filter(models.EmailOutbox.status == "FAILED").count()
+        except Exception:
+            pending, failed_rows = None, None
+        finally:
+            db.close()
+        with self._lock:
+            return {
+                "queueDepth": pending,
+                "failedRows": failed_rows,
+                "sent": self.sent,
+                "failed": self.failed,
+                "retried": self.retried,
+                "connectionsOpened": self.connections_opened,
+                "avgSendMs": round(self.send_seconds_total / self.sent * 1000, 2) if self.sent else 0.0,
+                "lastBatchSize": self.last_batch_size,
+                "running": bool(self._thread and self._thread.is_alive()),
+            }
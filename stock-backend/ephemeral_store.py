@@ -0,0 +1,372 @@
+import heapq
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+import models
+
+EPHEMERAL_STORE = os.getenv("EPHEMERAL_STORE")  # memory, db or redis; see create_store
+REDIS_URL = os.getenv("REDIS_URL")
+EPHEMERAL_SWEEP_INTERVAL = int(os.getenv("EPHEMERAL_SWEEP_INTERVAL", 60))
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class MemoryStore:
+    """Keys in a dict for O(1) lookups, with an expiry heap so sweeps only touch what has expired.
+
+    Per process only: under several workers use DBStore or RedisStore.
+    """
+
+    def __init__(self, sweep_interval=EPHEMERAL_SWEEP_INTERVAL):
+        self.sweep_interval = sweep_interval
+        self._data = {}  # key -> (expires_at, value)
+        self._expiries = []  # (expires_at, key) heap, may hold stale pairs for overwritten keys
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self.expired = 0
+
+    def set(self, key, value, ttl):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            heapq.heappush(self._expiries, (expires_at, key))
+            self._maybe_sweep()
+
+    def add(self, key, value, ttl):
+        """Sets key only when it is missing or expired; True when this call set it"""
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                return False
+            self._data[key] = (now + ttl, value)
+            heapq.heappush(self._expiries, (now + ttl, key))
+            self._maybe_sweep()
+            return True
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._data[key]
+                self.expired += 1
+                return None
+            return entry[1]
+
+    def pop(self, key):
+        """Returns and removes the value in one step, so a single-use token can only be redeemed once"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiries)
+            entry = self._data.get(key)
+            # Only drop the key if it wasn't re-set with a later expiry
+            if entry is not None and entry[0] == expires_at:
+                del self._data[key]
+                self.expired += 1
+
+    def sweep(self):
+        with self._lock:
+            self._last_sweep = 0
+            self._maybe_sweep()
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "keys": len(self._data), "expired": self.expired}
+
+
+class DBStore:
+    """Keys in the ephemeral_kv table (primary key lookups), shared by every worker using the same database"""
+
+    def __init__(self, session_factory, sweep_interval=EPHEMERAL_SWEEP_INTERVAL):
+        self.session_factory = session_factory
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.time()
+        self.expired = 0
+
+    def set(self, key, value, ttl):
+        values = {"key": key, "value": value, "expires_at": time.time() + ttl}
+        db = self.session_factory()
+        try:
+            insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+            if insert is not None:
+                # One statement, so concurrent sets of the same key can't both see it missing and collide
+                statement = insert(models.EphemeralEntry).values(**values)
+                db.execute(statement.on_conflict_do_update(
+                    index_elements=[models.EphemeralEntry.key],
+                    set_={"value": statement.excluded.value, "expires_at": statement.excluded.expires_at},
+                ))
+                db.commit()
+            else:
+                self._replace(db, values)
+        finally:
+            db.close()
+        self._maybe_sweep()
+
+    def add(self, key, value, ttl):
+        """Sets key only when it is missing or expired; True when this call set it"""
+        now = time.time()
+        values = {"key": key, "value": value, "expires_at": now + ttl}
+        db = self.session_factory()
+        try:
+            insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+            if insert is not None:
+                # An expired row is taken over, a live one is left alone and no row counts as changed
+                statement = insert(models.EphemeralEntry).values(**values)
+                result = db.execute(statement.on_conflict_do_update(
+                    index_elements=[models.EphemeralEntry.key],
+                    set_={"value": statement.excluded.value, "expires_at": statement.excluded.expires_at},
+                    where=models.EphemeralEntry.expires_at <= now,
+                ))
+                db.commit()
+                return result.rowcount == 1
+            for attempt in range(2):
+                db.add(models.EphemeralEntry(**values))
+                try:
+                    db.commit()
+                    return True
+                except IntegrityError:
+                    db.rollback()
+                expired = db.query(models.EphemeralEntry).filter(
+                    models.EphemeralEntry.key == key, models.EphemeralEntry.expires_at <= now
+                ).delete(synchronize_session=False)
+                db.commit()
+                if not expired:
+                    return False
+            return False
+        finally:
+            db.close()
+
+    @staticmethod
+    def _replace(db, values, attempts=3):
+        # Delete + insert for other databases; a concurrent set of the same key can still win the insert race
+        for attempt in range(attempts):
+            db.query(models.EphemeralEntry).filter(
+                models.EphemeralEntry.key == values["key"]
+            ).delete(synchronize_session=False)
+            db.add(models.EphemeralEntry(**values))
+            try:
+                db.commit()
+                return
+            except IntegrityError:
+                db.rollback()
+                if attempt + 1 == attempts:
+                    raise
+
+    def get(self, key):
+        db = self.session_factory()
+        try:
+            entry = db.query(models.EphemeralEntry).filter(models.EphemeralEntry.key == key).first()
+            if entry is None or entry.expires_at <= time.time():
+                return None
+            return entry.value
+        finally:
+            db.close()
+
+    def pop(self, key):
+        """Returns and removes the value; of two concurrent pops only the one whose delete hits the row wins"""
+        db = self.session_factory()
+        try:
+            entry = db.query(models.EphemeralEntry).filter(models.EphemeralEntry.key == key).first()
+            if entry is None:
+                return None
+            value, expires_at = entry.value, entry.expires_at
+            deleted = db.query(models.EphemeralEntry).filter(
+                models.EphemeralEntry.key == key, models.EphemeralEntry.expires_at == expires_at
+            ).delete(synchronize_session=False)
+            db.commit()
+            if not deleted or expires_at <= time.time():
+                return None
+            return value
+        finally:
+            db.close()
+
+    def delete(self, key):
+        db = self.session_factory()
+        try:
+            db.query(models.EphemeralEntry).filter(models.EphemeralEntry.key == key).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _maybe_sweep(self):
+        if time.time() - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+
+    def sweep(self):
+        self._last_sweep = time.time()
+        db = self.session_factory()
+        try:
+            removed = db.query(models.EphemeralEntry).filter(
+                models.EphemeralEntry.expires_at <= time.time()
+            ).delete(synchronize_session=False)
+            db.commit()
+            self.expired += removed
+        finally:
+            db.close()
+
+    def stats(self):
+        return {"backend": "db", "expired": self.expired}
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisStore:
+    """Keys in Redis (or anything speaking RESP) with server-side expiry, over one small built-in client"""
+
+    def __init__(self, url=REDIS_URL, timeout=2.0):
+        parsed = urlparse(url or "redis://localhost:6379/0")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+        self.reconnects = 0
+
+    # --- RESP ---
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("rb")
+        self.reconnects += 1
+        try:
+            if self.password:
+                self._send("AUTH", self.password)
+            if self.db:
+                self._send("SELECT", self.db)
+        except BaseException:
+            # Never leave a connection that skipped AUTH or SELECT around for the next call
+            self._close()
+            raise
+
+    def _close(self):
+        try:
+            if self._sock is not None:
+                self._sock.close()
+        except OSError:
+            pass
+        self._sock = None
+        self._reader = None
+
+    def _send(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self._sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis closed the connection")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)[:-2]
+            return data.decode("utf-8")
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def _call(self, fn, retry=True):
+        with self._lock:
+            # One reconnect per call covers a server restart or an idle connection dropped by a proxy. Calls that
+            # must not run twice pass retry=False: the server may have applied them before the connection dropped.
+            for attempt in range(2 if retry else 1):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return fn()
+                except (OSError, ConnectionError):
+                    self._close()
+                    if attempt or not retry:
+                        raise
+                except BaseException:
+                    # Protocol state unknown (an error reply inside MULTI, say): start on a clean connection
+                    self._close()
+                    raise
+
+    def _command(self, *args):
+        return self._call(lambda: self._send(*args))
+
+    # --- Store API ---
+    def set(self, key, value, ttl):
+        self._command("SET", key, value, "PX", int(ttl * 1000))
+
+    def add(self, key, value, ttl):
+        """Sets key only when it is missing or expired; True when this call set it"""
+        # Not retried: if the reply was lost the key may be ours already, and a retry would report it taken
+        return self._call(lambda: self._send("SET", key, value, "NX", "PX", int(ttl * 1000)), retry=False) == "OK"
+
+    def get(self, key):
+        return self._command("GET", key)
+
+    def pop(self, key):
+        # GET and DEL in one MULTI so two workers can't both redeem the key
+        def transaction():
+            self._send("MULTI")
+            self._send("GET", key)
+            self._send("DEL", key)
+            value, deleted = self._send("EXEC")
+            return value if deleted else None
+        # Never retried: a lost EXEC reply may already have redeemed the key
+        return self._call(transaction, retry=False)
+
+    def delete(self, key):
+        self._command("DEL", key)
+
+    def sweep(self):
+        pass  # Redis expires keys itself
+
+    def stats(self):
+        try:
+            keys = self._command("DBSIZE")
+        except (OSError, ConnectionError, RedisError):
+            keys = None
+        return {"backend": "redis", "host": f"{self.host}:{self.port}", "keys": keys, "reconnects": self.reconnects}
+
+
+def create_store(kind=EPHEMERAL_STORE, session_factory=None):
+    """Picks the backend: explicit kind, else Redis when REDIS_URL is set, else the shared DB table"""
+    kind = (kind or ("redis" if REDIS_URL else "db")).lower()
+    if kind == "redis":
+        return RedisStore(REDIS_URL)
+    if kind == "db" and session_factory is not None:
+        return DBStore(session_factory)
+    return MemoryStore()
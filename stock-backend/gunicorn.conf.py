@@ -0,0 +1,24 @@
+# gunicorn -c gunicorn.conf.py main:app
+import importlib
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+
+# Import the app once in the master; workers are forked from it and share those pages copy-on-write.
+# This is what keeps pandas, numpy and yfinance (imported by main at load) off each worker's start-up.
+# Importing main opens no DB connections and starts no background work (that happens on startup per worker).
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes")
+
+# sklearn is imported lazily; PRELOAD_ML=1 loads it in the master instead, so workers share one copy rather
+# than each importing it on their first /api/stocks/predict. (textblob and the prediction job pool run in
+# spawned processes, which don't inherit the master's memory, so preloading wouldn't help them.)
+PRELOAD_ML = os.getenv("PRELOAD_ML", "").lower() in ("1", "true", "yes")
+
+
+def on_starting(server):
+    if preload_app and PRELOAD_ML:
+        for module in ("sklearn.ensemble", "sklearn.linear_model"):
+            importlib.import_module(module)
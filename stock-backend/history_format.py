@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+HISTORY_COLUMNS = [("open", "Open"), ("high", "High"), ("low", "Low"), ("close", "Close"), ("volume", "Volume")]
+
+
+def _json_values(series):
+    """Column as a list with NaN as None: JSONResponse refuses NaN, and a bar Yahoo left empty must not sink the
+    whole response"""
+    values = series.to_numpy()
+    if values.dtype.kind != "f":
+        return values.tolist()
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+
+def _json_value(value):
+    return None if pd.isna(value) else value
+
+
+def history_rows(hist):
+    """One dict per bar, the default /api/stocks/history payload"""
+    data = []
+    for date, row in hist.iterrows():
+        data.append({
+            "date": date.strftime('%Y-%m-%d'),
+            "open": _json_value(row['Open']),
+            "high": _json_value(row['High']),
+            "low": _json_value(row['Low']),
+            "close": _json_value(row['Close']),
+            "volume": _json_value(row['Volume']),
+            "sma20": 0 if pd.isna(row['SMA_20']) else row['SMA_20'], # Handle NaN for first 20 days
+            "sma50": 0 if pd.isna(row['SMA_50']) else row['SMA_50']
+        })
+    return data
+
+
+def history_columns(hist):
+    """Parallel arrays per field, built from the frame's column buffers without a per-row loop"""
+    data = {"date": hist.index.strftime('%Y-%m-%d').tolist()}
+    for key, column in HISTORY_COLUMNS:
+        data[key] = _json_values(hist[column])
+    # NaN is not valid JSON, the first 20/50 bars report 0 like the row format
+    data["sma20"] = np.nan_to_num(hist['SMA_20'].to_numpy(dtype=float), nan=0.0).tolist()
+    data["sma50"] = np.nan_to_num(hist['SMA_50'].to_numpy(dtype=float), nan=0.0).tolist()
+    return data
+
+
+def price_points(hist):
+    """[{date, price}] close series used by the comparison chart"""
+    dates = hist.index.strftime('%Y-%m-%d').tolist()
+    return [{"date": date, "price": price} for date, price in zip(dates, _json_values(hist['Close']))]
+
+
+def rows_to_columns(rows):
+    """Converts a row payload (e.g. generated fallback data) to the columnar layout"""
+    keys = ["date"] + [key for key, _ in HISTORY_COLUMNS] + ["sma20", "sma50"]
+    return {key: [row[key] for row in rows] for key in keys}
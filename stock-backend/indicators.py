@@ -0,0 +1,206 @@
+import math
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+SMA_WINDOWS = (20, 50)
+RSI_WINDOW = 14
+MAX_BAR_GAP_DAYS = 4  # Long weekend; a wider gap between frames means missing bars
+FETCHED_AT = "fetchedAt"  # frame.attrs key: wall-clock time the frame's data came from upstream
+
+
+def stamp_fetched(frame, fetched_at=None):
+    """Records when frame was fetched; copies and slices of it (the cache hands out both) keep the stamp"""
+    if frame is not None:
+        frame.attrs[FETCHED_AT] = time.time() if fetched_at is None else fetched_at
+    return frame
+
+
+def day_keys(index):
+    """Normalizes a DatetimeIndex to timezone-free day precision so frames from any source line up"""
+    idx = pd.DatetimeIndex(index)
+    if idx.tz is not None:
+        idx = idx.tz_localize(None)
+    return idx.values.astype("datetime64[D]")
+
+
+class IndicatorState:
+    """Rolling SMA sums and Wilder-smoothed RSI for one symbol's daily closes, updated in O(1) per bar"""
+
+    def __init__(self):
+        self.dates = []
+        self.closes = []
+        self.sums = {w: 0.0 for w in SMA_WINDOWS}
+        self.sma = {w: [] for w in SMA_WINDOWS}
+        self.rsi = []
+        self.deltas = 0
+        self.gain_sum = 0.0  # Seed for the first Wilder average
+        self.loss_sum = 0.0
+        self.avg_gain = None
+        self.avg_loss = None
+        self.fetched_at = 0.0  # When the newest data folded in was fetched upstream, not when it was synced
+        self._undo = None
+
+    def append(self, date, close):
+        # Remember everything a bar touches so a revised last bar can be swapped in place
+        self._undo = (dict(self.sums), self.deltas, self.gain_sum, self.loss_sum, self.avg_gain, self.avg_loss)
+
+        self.dates.append(date)
+        self.closes.append(close)
+        n = len(self.closes)
+        for w in SMA_WINDOWS:
+            self.sums[w] += close
+            if n > w:
+                self.sums[w] -= self.closes[-w - 1]
+            self.sma[w].append(self.sums[w] / w if n >= w else math.nan)
+
+        if n > 1:
+            delta = close - self.closes[-2]
+            gain, loss = max(delta, 0.0), max(-delta, 0.0)
+            self.deltas += 1
+            if self.avg_gain is None:
+                self.gain_sum += gain
+                self.loss_sum += loss
+                if self.deltas == RSI_WINDOW:
+                    self.avg_gain = self.gain_sum / RSI_WINDOW
+                    self.avg_loss = self.loss_sum / RSI_WINDOW
+            else:
+                self.avg_gain = (self.avg_gain * (RSI_WINDOW - 1) + gain) / RSI_WINDOW
+                self.avg_loss = (self.avg_loss * (RSI_WINDOW - 1) + loss) / RSI_WINDOW
+        self.rsi.append(self._current_rsi())
+
+    def replace_last(self, close):
+        date = self.dates[-1]
+        self.sums, self.deltas, self.gain_sum, self.loss_sum, self.avg_gain, self.avg_loss = self._undo
+        self.dates.pop()
+        self.closes.pop()
+        for w in SMA_WINDOWS:
+            self.sma[w].pop()
+        self.rsi.pop()
+        self.append(date, close)
+
+    def _current_rsi(self):
+        if self.avg_gain is None:
+            return math.nan
+        if self.avg_loss == 0:
+            return math.nan if self.avg_gain == 0 else 100.0
+        rs = self.avg_gain / self.avg_loss
+        return 100 - (100 / (1 + rs))
+
+
+class IndicatorEngine:
+    """Per-symbol indicator state shared by history, prediction and the alert engine"""
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+        self.appended_bars = 0
+
+    @staticmethod
+    def _build(dates, closes):
+        state = IndicatorState()
+        for date, close in zip(dates, closes):
+            state.append(date, close)
+        return state
+
+    def sync(self, symbol, hist):
+        """Folds any new or revised bars from hist into the symbol's state and returns the state.
+
+        Freshness comes from hist.attrs[FETCHED_AT] (see stamp_fetched); an unstamped frame counts as fetched
+        at the epoch, so re-syncing an old cached frame never makes the state look recent, and a frame older
+        than the state's data does not overwrite its last close.
+        """
+        symbol = symbol.upper()
+        fetched_at = float(hist.attrs.get(FETCHED_AT, 0.0))
+        closes = hist['Close'].dropna()
+        if closes.empty:
+            return self._states.get(symbol)
+        dates = day_keys(closes.index)
+        values = closes.to_numpy(dtype=float).tolist()
+
+        with self._lock:
+            state = self._states.get(symbol)
+            if state is None or dates[0] < state.dates[0]:
+                # First sight, or a longer history than we have: start over from it
+                previous = state
+                state = self._build(dates, values)
+                if previous is not None and previous.fetched_at > fetched_at and previous.dates[-1] == state.dates[-1]:
+                    # Same last day, but our live close is newer than this frame's
+                    state.replace_last(previous.closes[-1])
+                    fetched_at = previous.fetched_at
+                self._states[symbol] = state
+                self.rebuilds += 1
+            elif dates[0] > state.dates[-1]:
+                gap_days = int((dates[0] - state.dates[-1]).astype(int))
+                if gap_days <= MAX_BAR_GAP_DAYS:
+                    # A short frame that picks up right after our last bar (weekend/holiday at most)
+                    for date, close in zip(dates, values):
+                        state.append(date, close)
+                        self.appended_bars += 1
+                elif len(values) >= max(SMA_WINDOWS):
+                    state = self._build(dates, values)
+                    self._states[symbol] = state
+                    self.rebuilds += 1
+                else:
+                    # Bars are missing in between, keep the old state rather than bridging the hole
+                    return state
+            else:
+                pos = int(np.searchsorted(dates, state.dates[-1]))
+                if pos < len(dates) and dates[pos] == state.dates[-1]:
+                    if values[pos] != state.closes[-1] and fetched_at >= state.fetched_at:
+                        state.replace_last(values[pos])
+                    pos += 1
+                for date, close in zip(dates[pos:], values[pos:]):
+                    state.append(date, close)
+                    self.appended_bars += 1
+            state.fetched_at = max(state.fetched_at, fetched_at)
+            return state
+
+    def sma(self, symbol, index, window):
+        """SMA values aligned to index. The first window-1 bars stay NaN, matching rolling() on that frame."""
+        result = np.full(len(index), np.nan)
+        with self._lock:
+            state = self._states.get(symbol.upper())
+            if state is None or not len(index):
+                return result
+            state_dates = np.array(state.dates)
+            state_sma = np.array(state.sma[window])
+        keys = day_keys(index)
+        pos = np.searchsorted(state_dates, keys)
+        found = (pos < len(state_dates)) & (state_dates[np.minimum(pos, len(state_dates) - 1)] == keys)
+        result[found] = state_sma[pos[found]]
+        result[:window - 1] = np.nan
+        return result
+
+    def latest(self, symbol):
+        """Most recent close, SMAs and RSI for a symbol, or None if it has never been synced.
+        ageSeconds is the age of the data behind the close (None if no synced frame was stamped)."""
+        with self._lock:
+            state = self._states.get(symbol.upper())
+            if state is None:
+                return None
+            latest = {
+                "date": str(state.dates[-1]),
+                "close": state.closes[-1],
+                "rsi": state.rsi[-1],
+                "ageSeconds": time.time() - state.fetched_at if state.fetched_at else None,
+            }
+            for w in SMA_WINDOWS:
+                latest[f"sma{w}"] = state.sma[w][-1]
+            return latest
+
+    def stats(self):
+        with self._lock:
+            return {"symbols": len(self._states), "rebuilds": self.rebuilds, "appendedBars": self.appended_bars}
+
+
+def latest_indicators(hist):
+    """One-off full pass over a frame, for callers without a shared engine (e.g. worker processes)"""
+    closes = hist['Close'].dropna()
+    state = IndicatorEngine._build(day_keys(closes.index), closes.to_numpy(dtype=float).tolist())
+    if not state.closes:
+        return {"close": math.nan, "rsi": math.nan, **{f"sma{w}": math.nan for w in SMA_WINDOWS}}
+    return {"close": state.closes[-1], "rsi": state.rsi[-1], **{f"sma{w}": state.sma[w][-1] for w in SMA_WINDOWS}}
@@ -1,50 +1,158 @@
 from fastapi import FastAPI, HTTPException, Depends, status, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from passlib.context import CryptContext
+# Imported eagerly on purpose: nearly every endpoint and helper module needs them, so deferring would only move
+# the cost into the first request. Under gunicorn, preload_app imports them once in the master instead.
 import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from textblob import TextBlob 
-from email.mime.text import MIMEText
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-import smtplib # For sending emails
+# Structured logs go through a queue to a writer thread; set it up before the local modules log anything
+from log_config import setup_logging, logging_stats
+setup_logging()
+
+import logging
 import asyncio # For background loops
 import secrets  # For generating secure tokens
+import time
+import json
+from functools import partial
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
 
 # --- Import Local Modules ---
 # Make sure database.py and models.py exist in the same folder!
-from database import engine, get_db
+from database import engine, get_db, SessionLocal
 import models
+from market_cache import OHLCVCache, TTLCache, PERIOD_DAYS
+from singleflight import SingleFlight
+from quotes import download_bulk_history, fetch_history, latest_changes, returns_correlation
+from alert_engine import AlertIndex
+from email_outbox import OutboxSender, enqueue_email
+from ml_engine import model_cache, build_prediction
+from prediction_jobs import PredictionJobs
+from history_format import history_rows, history_columns, price_points, rows_to_columns
+from indicators import IndicatorEngine, day_keys, stamp_fetched, FETCHED_AT
+from ohlcv_store import OHLCVStore, FIELDS as OHLCV_FIELDS
+from quote_stream import QuoteStreamHub
+from news_sentiment import NewsCache, SentimentScorer
+from auth import create_token_pair, verify_refresh_token, get_current_user, require_same_user
+from password_pool import PasswordHasher, PasswordPoolBusy
+from ephemeral_store import create_store
+from db_metrics import QueryStats, route_path
+from upstream_http import UpstreamClient, CircuitOpen, http_session
+from metrics import (registry as metrics_registry, upstream, REQUEST_SECONDS,
+                     ALERT_CYCLE_SECONDS, PREDICTION_SECONDS, FALLBACK_SERVED)
+
+logger = logging.getLogger(__name__)
+alert_log = logging.getLogger("main.alerts")
+fetch_log = logging.getLogger("main.fetch")
+auth_log = logging.getLogger("main.auth")
 
 # --- Initialize App & Database ---
 app = FastAPI()
 
-# Create Database Tables automatically if they don't exist
-try:
-    models.Base.metadata.create_all(bind=engine)
-    print("Database tables created successfully")
-except Exception as e:
-    print(f"Warning: Could not create database tables: {e}")
-    print("Application will continue, but database operations may fail")
+# Query counts, DB time and slow queries per endpoint, from engine events
+query_stats = QueryStats()
+query_stats.attach(engine)
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    usage, token = query_stats.begin_request(request.scope)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        query_stats.end_request(usage, token)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route_path(request.scope), str(status_code))
+
+# Create Database Tables automatically if they don't exist. This runs on startup, not at import, so importing
+# the app (gunicorn preload, benchmarks, scripts) never opens a DB connection; start.sh also creates them.
+CREATE_TABLES_ON_STARTUP = os.getenv("CREATE_TABLES_ON_STARTUP", "1").lower() in ("1", "true", "yes")
+
+def create_tables():
+    try:
+        models.Base.metadata.create_all(bind=engine)
+        logger.info("Database tables created successfully")
+    except Exception as e:
+        logger.warning("Could not create database tables, database operations may fail: %s", e)
 
 @app.get("/api/health")
 def health_check():
     return {"status": "healthy", "database": "connected", "version": "1.0"}
 
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+def cache_gauges():
+    ohlcv = ohlcv_cache.stats()
+    news = news_cache.stats()
+    return [
+        ("ohlcv_cache_hits", "OHLCV cache hits since start", ohlcv["hits"]),
+        ("ohlcv_cache_misses", "OHLCV cache misses since start", ohlcv["misses"]),
+        ("ohlcv_cache_bytes", "Approximate bytes held by the OHLCV cache", ohlcv["bytes"]),
+        ("ohlcv_cache_evictions", "OHLCV cache evictions since start", ohlcv["evictions"]),
+        ("news_cache_hits", "News cache hits since start", news["hits"]),
+        ("news_cache_misses", "News cache misses since start", news["misses"]),
+        ("ticker_cache_entries", "Validated tickers held for reuse", len(ticker_cache)),
+    ]
+
+def breaker_gauges():
+    upstream_stats = yahoo.stats()
+    return [
+        ("upstream_breaker_open", "1 while the Yahoo circuit breaker is open or half-open",
+         int(upstream_stats["breaker"]["state"] != "closed")),
+        ("upstream_symbol_breakers_open", "Symbols whose circuit breaker is open or half-open",
+         upstream_stats["keys"]["open"]),
+        ("upstream_retries", "Yahoo call retries since start", upstream_stats["retries"]),
+        ("alert_fetch_in_flight", "Alert price fetch batches still running", alert_fetch_stats["inFlight"]),
+        ("alert_fetch_timed_out", "Alert price fetch batches a cycle stopped waiting for", alert_fetch_stats["timedOut"]),
+    ]
+
+metrics_registry.register_gauges(cache_gauges)
+metrics_registry.register_gauges(breaker_gauges)
+
+@app.get("/api/internal/stats")
+def internal_stats():
+    return {
+        "ohlcvCache": ohlcv_cache.stats(),
+        "tickers": len(ticker_cache),
+        "singleFlight": {"ticker": ticker_flight.stats(), "history": history_flight.stats()},
+        "alertFetch": dict(alert_fetch_stats),
+        "upstream": yahoo.stats(),
+        "emailOutbox": email_sender.stats(),
+        "modelCache": model_cache.stats(),
+        "predictionJobs": prediction_jobs.stats(),
+        "indicators": indicator_engine.stats(),
+        "ohlcvStore": ohlcv_store.stats(),
+        "quoteStream": quote_hub.stats(),
+        "news": {"cache": news_cache.stats(), "fetches": news_flight.stats(), "sentiment": sentiment_scorer.stats()},
+        "passwordHasher": password_hasher.stats(),
+        "ephemeralStore": ephemeral_store.stats(),
+        "database": query_stats.stats(),
+        "logging": logging_stats()
+    }
+
 # Password Hashing Configuration
-# Using bcrypt with rounds=12 to prevent the "password too long" error
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=12)
+# bcrypt runs on its own bounded process pool; when its queue is full auth requests get a fast 503
+password_hasher = PasswordHasher()
+
+@app.exception_handler(PasswordPoolBusy)
+def password_pool_busy_handler(request: Request, exc: PasswordPoolBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
 
 # --- CORS Configuration ---
 app.add_middleware(
@@ -65,7 +173,70 @@ EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")  # Default to Gmail if not set
 SMTP_PORT = int(os.getenv("SMTP_PORT", 587))  # Default to 587 if not set
-SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_hex(32))  # Fallback to random key in development
+
+# --- MARKET DATA CACHE ---
+# One in-process cache shared by every endpoint, so predict can reuse the frame history just pulled
+ohlcv_cache = OHLCVCache(max_bytes=int(os.getenv("OHLCV_CACHE_MAX_BYTES", 64 * 1024 * 1024)))
+TICKER_CACHE_TTL = int(os.getenv("TICKER_CACHE_TTL", 300))  # Seconds to reuse a validated yf.Ticker (and its .info)
+# A Ticker keeps a copy of the last history it fetched plus its .info, outside the OHLCV byte budget; cap the count
+TICKER_CACHE_MAX_ENTRIES = int(os.getenv("TICKER_CACHE_MAX_ENTRIES", 256))
+ticker_cache = TTLCache(TICKER_CACHE_TTL, TICKER_CACHE_MAX_ENTRIES)
+# Concurrent requests for the same symbol wait on one upstream fetch instead of each hitting Yahoo
+ticker_flight = SingleFlight("ticker")
+# Circuit breakers, retries and time budgets for every Yahoo call (see call_yahoo)
+yahoo = UpstreamClient("yahoo")
+history_flight = SingleFlight("history")
+# Rolling SMA/RSI state per symbol, advanced bar by bar as new data is fetched
+indicator_engine = IndicatorEngine()
+# Completed daily bars live on disk; Yahoo is only asked for bars after the last stored date, and a symbol is
+# backfilled for the range that was actually requested (a longer range later extends it)
+ohlcv_store = OHLCVStore()
+STORE_PERIODS = {"1mo", "3mo", "6mo", "1y", "2y", "5y"}
+MAX_BATCH_SYMBOLS = int(os.getenv("MAX_BATCH_SYMBOLS", 50))
+MAX_COMPARE_SYMBOLS = 20
+compare_executor = ThreadPoolExecutor(max_workers=MAX_COMPARE_SYMBOLS, thread_name_prefix="compare")
+
+# --- ALERT WORKER CONFIG ---
+# The alert cycle runs on its own thread so blocking yfinance/DB/SMTP calls never touch the event loop,
+# and prices are fetched in symbol batches on a bounded pool. A cycle waits at most ALERT_FETCH_TIMEOUT for them;
+# the fetches themselves end on their own because every Yahoo request has a timeout (see call_yahoo).
+ALERT_CHECK_INTERVAL = int(os.getenv("ALERT_CHECK_INTERVAL", 10))
+ALERT_FETCH_CONCURRENCY = int(os.getenv("ALERT_FETCH_CONCURRENCY", 4))
+ALERT_FETCH_BATCH_SIZE = int(os.getenv("ALERT_FETCH_BATCH_SIZE", 50))
+ALERT_FETCH_TIMEOUT = float(os.getenv("ALERT_FETCH_TIMEOUT", 15))
+ALERT_PRICE_MAX_AGE = float(os.getenv("ALERT_PRICE_MAX_AGE", 60))  # Seconds an engine close may stand in for a failed fetch
+alert_cycle_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="alert-cycle")
+alert_fetch_executor = ThreadPoolExecutor(max_workers=ALERT_FETCH_CONCURRENCY, thread_name_prefix="alert-fetch")
+# Batches still running (including ones a past cycle stopped waiting for), and how often work was late or held back
+alert_fetch_lock = threading.Lock()
+alert_fetch_stats = {"inFlight": 0, "timedOut": 0, "skippedCycles": 0}
+
+# --- EMAIL OUTBOX ---
+# Emails are written to the email_outbox table and delivered by one background sender
+# that keeps its SMTP session open between messages and retries failures with backoff.
+email_sender = OutboxSender(
+    SessionLocal,
+    SMTP_SERVER,
+    SMTP_PORT,
+    EMAIL_ADDRESS,
+    EMAIL_PASSWORD,
+    batch_size=int(os.getenv("EMAIL_BATCH_SIZE", 20)),
+    max_attempts=int(os.getenv("EMAIL_MAX_ATTEMPTS", 5)),
+    backoff_base=int(os.getenv("EMAIL_BACKOFF_SECONDS", 30)),
+)
+
+# --- FALLBACK DATA FOR COMMON SYMBOLS ---
+FALLBACK_QUOTES = {
+    "^NSEI": {"name": "NIFTY 50", "price": 19850.75, "change": 150.25, "changePercent": 0.76},
+    "^BSESN": {"name": "SENSEX", "price": 65800.50, "change": 250.30, "changePercent": 0.38},
+    "BTC-USD": {"name": "Bitcoin USD", "price": 42500.00, "change": 1200.00, "changePercent": 2.91},
+    "RELIANCE.NS": {"name": "Reliance Industries Ltd.", "price": 2850.30, "change": 25.60, "changePercent": 0.91},
+    "TCS.NS": {"name": "Tata Consultancy Services", "price": 3650.75, "change": 45.20, "changePercent": 1.25},
+    "HDFCBANK.NS": {"name": "HDFC Bank Ltd.", "price": 1585.40, "change": 12.30, "changePercent": 0.78},
+    "AAPL": {"name": "Apple Inc.", "price": 185.50, "change": 2.30, "changePercent": 1.25},
+    "TSLA": {"name": "Tesla Inc.", "price": 245.80, "change": -3.20, "changePercent": -1.28},
+    "NVDA": {"name": "NVIDIA Corporation", "price": 485.60, "change": 8.40, "changePercent": 1.76}
+}
 
 # --- Pydantic Models (Input Validation) ---
 class UserCreate(BaseModel):
@@ -91,6 +262,12 @@ class WatchlistAdd(BaseModel):
     quantity: int = 1         # <--- New
     buy_price: float = 0.0
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class PredictionJobCreate(BaseModel):
+    symbol: str
+
 class AlertCreate(BaseModel):
     user_id: int
     symbol: str
@@ -105,201 +282,345 @@ class UserUpdate(BaseModel):
     new_password: Optional[str] = None
     confirm_password: Optional[str] = None
 
-# Store password reset tokens in memory (in production, use a database)
-password_reset_tokens = {}
+# Password reset tokens live in a store every worker shares: reset:{token} -> email
+ephemeral_store = create_store(session_factory=SessionLocal)
+RESET_TOKEN_TTL = 24 * 3600  # Token valid for 24 hours
 
 # --- HELPER FUNCTIONS ---
 
-def send_email_notification(to_email, subject, body):
-    print(f"\n[📧 SENDING EMAIL] To: {to_email} | Subject: {subject}")
+def send_email_notification(to_email, subject, body, db=None):
+    """Queues an email in the outbox; pass the caller's session to commit it with the caller's changes"""
+    logger.info("Queueing email", extra={"to": to_email, "subject": subject})
     
     try:
-        # Create message
-        msg = MIMEText(body, 'html' if '<html>' in body else 'plain')
-        msg['Subject'] = subject
-        msg['From'] = EMAIL_ADDRESS
-        msg['To'] = to_email
-
-        # Connect to SMTP server with TLS
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
-            server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            
-            # Send the email
-            server.send_message(msg)
-            
-        print(f"✅ Email successfully sent to {to_email}!")
+        if db is not None:
+            enqueue_email(db, to_email, subject, body, commit=False)
+        else:
+            session = SessionLocal()
+            try:
+                enqueue_email(session, to_email, subject, body)
+            finally:
+                session.close()
+            email_sender.notify()
         return True
         
-    except smtplib.SMTPAuthenticationError:
-        print("❌ SMTP Authentication Error: The server didn't accept the username/password combination.")
-    except smtplib.SMTPException as e:
-        print(f"❌ SMTP Error: {e}")
-    except Exception as e:
-        print(f"❌ Unexpected error while sending email: {e}")
+    except Exception:
+        logger.exception("Unexpected error while queueing email")
     
     return False
 
 # --- BACKGROUND TASK: Check Alerts ---
-# # --- BACKGROUND TASK: Check Alerts (DEBUG VERSION) ---
-async def check_price_alerts():
-    print("🚀 Alert System Started...")
-    while True:
-        print("🔍 Checking alerts cycle...")
-        db = next(get_db()) 
-        active_alerts = db.query(models.Alert).filter(models.Alert.status == "ACTIVE").all()
+def run_alert_cycle():
+    """Evaluates every ACTIVE alert, fetching each distinct symbol once"""
+    db = next(get_db())
+    try:
+        rows = db.query(
+            models.Alert.id, models.Alert.symbol, models.Alert.target_price, models.Alert.condition
+        ).filter(models.Alert.status == "ACTIVE").all()
         
-        if not active_alerts:
-            print("   No active alerts found.")
-
-        for alert in active_alerts:
-            try:
-                stock = yf.Ticker(alert.symbol)
-                data = stock.history(period="1d")
-                
-                if data.empty: 
-                    print(f"   ⚠️ No data for {alert.symbol}")
-                    continue
-                
-                current_price = data['Close'].iloc[-1]
-                
-                # --- DEBUG PRINT ---
-                print(f"   👉 Checking {alert.symbol}: Current {current_price:.2f} | Target {alert.target_price} | Condition {alert.condition}")
-                # -------------------
-
-                triggered = False
-                if alert.condition == "ABOVE" and current_price >= alert.target_price:
-                    triggered = True
-                    print("      ✅ CONDITION MET (ABOVE)")
-                elif alert.condition == "BELOW" and current_price <= alert.target_price:
-                    triggered = True
-                    print("      ✅ CONDITION MET (BELOW)")
-                else:
-                    print("      ❌ Not triggered yet")
-                    
-                if triggered:
-                    user = db.query(models.User).filter(models.User.id == alert.user_id).first()
-                    subject = f"🔔 Stock Alert: {alert.symbol} hit {current_price:.2f}"
-                    body = f"Hello {user.full_name},\n\nYour alert for {alert.symbol} has been triggered!\n\nCurrent Price: {current_price:.2f}\nTarget: {alert.target_price}\n\nHappy Trading!"
-                    
-                    send_email_notification(user.email, subject, body)
-                    
-                    alert.status = "TRIGGERED"
-                    db.commit()
-                    
-            except Exception as e:
-                print(f"Error checking alert for {alert.symbol}: {e}")
+        index = AlertIndex.build(rows)
+        if not len(index):
+            alert_log.debug("No active alerts found")
+            return
         
+        symbols = index.symbols()
+        prices = fetch_alert_prices(symbols)
+        # Symbols whose fetch failed or timed out can still use a close the indicator engine saw recently
+        for symbol in symbols:
+            if symbol not in prices:
+                latest = indicator_engine.latest(symbol)
+                if latest and latest["ageSeconds"] is not None and latest["ageSeconds"] <= ALERT_PRICE_MAX_AGE:
+                    prices[symbol] = latest["close"]
+        alert_log.info("Checking alerts", extra={"alerts": len(index), "symbols": len(symbols), "priced": len(prices)})
+        
+        triggered_ids = []
+        for symbol, current_price in prices.items():
+            triggered_ids.extend(index.triggered(symbol, current_price))
+        
+        if not triggered_ids:
+            return
+        
+        # Plain rows, not ORM objects: each alert commits on its own below, which would expire them
+        alerts = db.query(
+            models.Alert.id, models.Alert.user_id, models.Alert.symbol, models.Alert.condition, models.Alert.target_price
+        ).filter(
+            models.Alert.id.in_(triggered_ids),
+            models.Alert.status == "ACTIVE"
+        ).all()
+        user_ids = {alert.user_id for alert in alerts}
+        users = {user.id: (user.email, user.full_name)
+                 for user in db.query(models.User.id, models.User.email, models.User.full_name).filter(
+                     models.User.id.in_(user_ids)).all()}
+        
+        queued = 0
+        for alert in alerts:
+            # Every worker runs this loop: only the one whose conditional update flips the row sends the email
+            claimed = db.query(models.Alert).filter(
+                models.Alert.id == alert.id,
+                models.Alert.status == "ACTIVE"
+            ).update({"status": "TRIGGERED"}, synchronize_session=False)
+            if claimed != 1:
+                db.rollback()
+                continue
+            current_price = prices[alert.symbol.upper()]
+            alert_log.info("Alert condition met", extra={"alertId": alert.id, "symbol": alert.symbol, "condition": alert.condition,
+                                                       "price": round(current_price, 2), "target": alert.target_price})
+            user = users.get(alert.user_id)
+            if user:
+                email, full_name = user
+                subject = f"🔔 Stock Alert: {alert.symbol} hit {current_price:.2f}"
+                body = f"Hello {full_name},\n\nYour alert for {alert.symbol} has been triggered!\n\nCurrent Price: {current_price:.2f}\nTarget: {alert.target_price}\n\nHappy Trading!"
+                queued += send_email_notification(email, subject, body, db=db)
+            # The claim and its queued email are committed together
+            db.commit()
+        if queued:
+            email_sender.notify()
+    finally:
         db.close()
-        await asyncio.sleep(10)
-
 
-def fetch_stock_data(symbol: str):
-    # Enhanced Yahoo Finance fetch with better error handling
-    import requests
-    import time
+def fetch_alert_prices(symbols):
+    """Prices symbols in batches on the alert fetch pool, waiting at most ALERT_FETCH_TIMEOUT for all of them"""
+    with alert_fetch_lock:
+        if alert_fetch_stats["inFlight"] >= ALERT_FETCH_CONCURRENCY:
+            # Every fetch thread is still busy with an earlier cycle's work; queueing more would only stack up
+            # behind it, so this cycle makes do with the prices the indicator engine already has
+            alert_fetch_stats["skippedCycles"] += 1
+            alert_log.warning("Alert price fetch skipped, %d batches from earlier cycles still running",
+                              alert_fetch_stats["inFlight"])
+            return {}
     
-    # Create session with proper headers
-    session = requests.Session()
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip, deflate',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Referer': 'https://finance.yahoo.com/',
-    })
+    batches = [symbols[i:i + ALERT_FETCH_BATCH_SIZE] for i in range(0, len(symbols), ALERT_FETCH_BATCH_SIZE)]
+    futures = {}
+    for batch in batches:
+        with alert_fetch_lock:
+            alert_fetch_stats["inFlight"] += 1
+        # The alert cycle is a background thread, so failed fetches may wait and retry
+        future = alert_fetch_executor.submit(get_latest_prices, batch, True)
+        future.add_done_callback(_alert_fetch_done)
+        futures[future] = batch
     
-    # Try multiple approaches with different strategies
-    for attempt in range(3):
+    done, not_done = wait_futures(futures, timeout=ALERT_FETCH_TIMEOUT)
+    prices = {}
+    for future in done:
         try:
-            # Clear any cached data
-            yf.utils._cache.clear()
-            
-            ticker = yf.Ticker(symbol, session=session)
-            
-            # Test with different periods
-            for period in ["1d", "5d", "1mo"]:
-                try:
-                    test_data = ticker.history(period=period)
-                    if not test_data.empty:
-                        print(f"Successfully fetched real data for {symbol} with period {period}")
-                        return ticker
-                except Exception as e:
-                    print(f"Period {period} failed for {symbol}: {e}")
-                    continue
-                    
-            # If all periods fail, wait and retry
-            time.sleep(2)
-            
+            prices.update(future.result())
         except Exception as e:
-            print(f"Attempt {attempt + 1} failed for {symbol}: {e}")
-            if attempt < 2:
-                time.sleep(3)
-            continue
+            alert_log.warning("Price fetch failed for %d symbols: %s", len(futures[future]), e)
+    if not_done:
+        with alert_fetch_lock:
+            alert_fetch_stats["timedOut"] += len(not_done)
+        alert_log.warning("Price fetch timed out for %d symbols",
+                          sum(len(futures[future]) for future in not_done))
+    return prices
+
+def _alert_fetch_done(future):
+    with alert_fetch_lock:
+        alert_fetch_stats["inFlight"] -= 1
+
+async def check_price_alerts():
+    alert_log.info("Alert system started")
+    loop = asyncio.get_event_loop()
+    while True:
+        alert_log.debug("Checking alerts cycle")
+        started = time.monotonic()
+        try:
+            with ALERT_CYCLE_SECONDS.time():
+                await loop.run_in_executor(alert_cycle_executor, run_alert_cycle)
+        except Exception:
+            alert_log.exception("Error in alert cycle")
+        # Keep a steady cadence: a slow cycle shortens the wait instead of stacking on top of it
+        await asyncio.sleep(max(0, ALERT_CHECK_INTERVAL - (time.monotonic() - started)))
+
+
+# --- YAHOO CALLS ---
+# Every Yahoo request goes through call_yahoo: one shared keep-alive session, request timeouts capped to a time
+# budget, and circuit breakers per symbol and for Yahoo as a whole. While one is open the call returns None at once
+# and callers fall back (cached or fallback data) instead of piling up on a failing upstream.
+def call_yahoo(call, symbol, fn, *args, backoff=False):
+    """fn(*args) behind the Yahoo breakers, each attempt timed as `call`; None when a circuit is open"""
+    try:
+        return yahoo.call(symbol.upper() if symbol else None, _timed_attempt, call, fn, args, backoff=backoff)
+    except CircuitOpen as e:
+        fetch_log.info("Skipping %s: %s", call, e)
+        return None
+
+def _timed_attempt(call, fn, args):
+    with upstream(call):
+        return fn(*args)
+
+def _history_or_none(ticker, params):
+    hist = ticker.history(**params)
+    return None if hist.empty else stamp_fetched(hist)
+
+def _ticker_info(ticker):
+    return ticker.info
+
+def _ticker_news(symbol):
+    return yf.Ticker(symbol, session=http_session()).news
+
+def _bulk_fetch(symbol, period, interval, backoff=False):
+    return stamp_fetched(call_yahoo("bulk_download", symbol, fetch_history, symbol, period, interval, backoff=backoff))
+
+def fetch_stock_data(symbol: str):
+    # Reuse a ticker that was validated recently instead of probing Yahoo again
+    cached = ticker_cache.get(symbol.upper())
+    if cached is not None:
+        return cached
     
-    # Last resort - try without session
+    return ticker_flight.do(symbol.upper(), _probe_stock_data, symbol)
+
+def _probe_stock_data(symbol: str):
     try:
-        ticker = yf.Ticker(symbol)
-        test_data = ticker.history(period="1d")
-        if not test_data.empty:
-            print(f"Fallback successful for {symbol}")
-            return ticker
+        return call_yahoo("ticker_probe", symbol, _probe_attempt, symbol)
     except Exception as e:
-        print(f"Fallback also failed for {symbol}: {e}")
+        fetch_log.warning("Could not fetch %s: %s", symbol, e)
+        return None
+
+def _probe_attempt(symbol: str):
+    ticker = yf.Ticker(symbol, session=http_session())
+    # 5d is what the quote endpoint reads next, so the probe doubles as its history fetch
+    data = ticker.history(period="5d")
+    if data.empty:
+        fetch_log.info("No data for %s", symbol)
+        return None
+    ohlcv_cache.put(symbol, "5d", stamp_fetched(data))
+    ticker_cache.put(symbol.upper(), ticker)
+    return ticker
+
+def get_stock_history(symbol: str, period: str, interval: str = "1d", stock=None):
+    """Returns OHLCV history for a symbol, served from the shared cache when fresh"""
+    hist = ohlcv_cache.get(symbol, period, interval)
+    if hist is not None:
+        return hist
+    
+    key = (symbol.upper(), period, interval)
+    hist = history_flight.do(key, _download_history, symbol, period, interval, stock)
+    # Coalesced callers all receive the same frame, give each one its own copy
+    return hist.copy()
+
+def _download_history(symbol: str, period: str, interval: str, stock=None):
+    if interval == "1d" and period in STORE_PERIODS:
+        hist = read_stored_history(symbol, period, stock)
+        if hist is not None:
+            ohlcv_cache.put(symbol, period, hist, interval)
+            return hist
+    
+    if stock is None:
+        stock = fetch_stock_data(symbol)
+    if stock is None:
+        return pd.DataFrame()
+    
+    hist = call_yahoo("history", symbol, _history_or_none, stock, {"period": period, "interval": interval})
+    if hist is None:
+        return pd.DataFrame()
+    ohlcv_cache.put(symbol, period, hist, interval)
+    return hist
+
+def read_stored_history(symbol: str, period: str, stock=None):
+    """Daily bars for a period from the local store plus the live tail, or None if nothing is stored"""
+    def fetch_bars(start=None, period=None):
+        ticker = stock if stock is not None else fetch_stock_data(symbol)
+        if ticker is None:
+            return pd.DataFrame()
+        params = {"period": period} if start is None else {"start": start.strftime('%Y-%m-%d')}
+        hist = call_yahoo("history", symbol, _history_or_none, ticker, params)
+        return hist if hist is not None else pd.DataFrame()
+    
+    # The store only holds completed bars; the last couple of days (incl. today's) come from a small live frame,
+    # which also tells the store whether Yahoo has re-based its history since the stored bars were fetched
+    live = get_stock_history(symbol, "5d", stock=stock)
+    try:
+        ohlcv_store.sync(symbol, fetch_bars, period, live=live)
+    except Exception:
+        fetch_log.warning("OHLCV store sync failed for %s", symbol, exc_info=True)
+    
+    since = datetime.utcnow().date() - timedelta(days=PERIOD_DAYS[period])
+    hist = ohlcv_store.read(symbol, since=since)
+    if hist.empty:
+        return None
+    
+    if not live.empty:
+        live = live[list(OHLCV_FIELDS)].copy()
+        live.index = pd.DatetimeIndex(day_keys(live.index), name="Date")
+        hist = pd.concat([hist, live[live.index > hist.index[-1]]])
+        # The stored bars are completed days; how fresh the frame is depends on the live tail
+        stamp_fetched(hist, live.attrs.get(FETCHED_AT, 0.0))
+    return hist
+
+def get_bulk_history(symbols, period: str = "5d", backoff: bool = False, fresh: bool = False):
+    """Returns {symbol: frame}, using fresh cached frames and parallel per-symbol fetches for the rest.
+    backoff=True lets failed fetches retry with waits, for background callers only; fresh=True skips the cache."""
+    frames = {}
+    missing = []
+    for symbol in symbols:
+        cached = None if fresh else ohlcv_cache.get(symbol, period)
+        if cached is not None and not cached.empty:
+            frames[symbol] = cached
+        else:
+            missing.append(symbol)
+    
+    if missing:
+        try:
+            downloaded = download_bulk_history(missing, period, fetch=partial(_bulk_fetch, backoff=backoff))
+        except Exception as e:
+            fetch_log.warning("Bulk download failed for %d symbols: %s", len(missing), e)
+            downloaded = {}
+        for symbol, frame in downloaded.items():
+            ohlcv_cache.put(symbol, period, frame)
+            frames[symbol] = frame
+    return frames
+
+def get_latest_prices(symbols, backoff: bool = False):
+    """Latest close per symbol from the "1d" bulk history, {symbol: price}"""
+    frames = get_bulk_history([symbol.upper() for symbol in symbols], "1d", backoff)
+    prices = {}
+    for symbol, frame in frames.items():
+        # Advances the symbol's SMA/RSI state by the live bar, O(1)
+        indicator_engine.sync(symbol, frame)
+        closes = frame["Close"].dropna()
+        if not closes.empty:
+            prices[symbol] = float(closes.iloc[-1])
+    return prices
+
+def get_bulk_quotes(symbols, backoff: bool = False, fresh: bool = False):
+    """Price, previous close, change, changePercent and volume per symbol, indexed by symbol"""
+    frames = get_bulk_history(symbols, "5d", backoff, fresh)
+    if not frames:
+        return pd.DataFrame(columns=["price", "prevClose", "change", "changePercent", "volume"])
     
-    print(f"All attempts failed for {symbol}")
-    return None
+    closes = pd.DataFrame({symbol: frame["Close"] for symbol, frame in frames.items()})
+    volumes = pd.DataFrame({symbol: frame["Volume"] for symbol, frame in frames.items()})
+    quotes = latest_changes(closes)
+    quotes["volume"] = volumes.ffill().iloc[-1].fillna(0)
+    return quotes
 
 def verify_password(plain_password, hashed_password):
-    try:
-        # Truncate password to 72 bytes max for bcrypt
-        password_bytes = plain_password.encode('utf-8')
-        if len(password_bytes) > 72:
-            password_bytes = password_bytes[:72]
-            plain_password = password_bytes.decode('utf-8', errors='ignore')
-        return pwd_context.verify(plain_password, hashed_password)
-    except Exception as e:
-        print(f"Password verification error: {e}")
-        return False
+    # Raises PasswordPoolBusy instead of blocking when the hashing queue is full
+    return password_hasher.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
-
-def calculate_rsi(data, window=14):
-    """Calculates the Relative Strength Index (RSI)"""
-    delta = data['Close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-    
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi.iloc[-1] # Return the most recent RSI value
+    return password_hasher.hash(password)
 
 # --- HELPER: Get Basic Info (Reused for Comparison) ---
 # --- HELPER: Get Basic Info & History for Comparison ---
 def get_stock_info_internal(symbol: str):
     try:
         stock = fetch_stock_data(symbol)
-        info = stock.info
+        if stock is None:
+            return None
+        info = call_yahoo("info", symbol, _ticker_info, stock)
+        if info is None:
+            return None
         
         # 1. Fetch 6 months history for the chart
-        hist = stock.history(period="6mo")
+        hist = get_stock_history(symbol, "6mo", stock=stock)
         
         if hist.empty:
             return None
             
         # Format history for the frontend graph
         # We only need Date and Close price
-        history_data = []
-        for date, row in hist.iterrows():
-            history_data.append({
-                "date": date.strftime('%Y-%m-%d'),
-                "price": row['Close']
-            })
+        history_data = price_points(hist)
 
         current_price = hist['Close'].iloc[-1]
         prev_close = hist['Close'].iloc[-2] if len(hist) > 1 else current_price
@@ -330,7 +651,7 @@ def get_stock_info_internal(symbol: str):
             "history": history_data # <--- Sending History Data
         }
     except Exception as e:
-        print(f"Error fetching comparison data for {symbol}: {e}")
+        logger.warning("Error fetching comparison data for %s: %s", symbol, e)
         return None
 
 
@@ -338,7 +659,8 @@ def get_stock_info_internal(symbol: str):
 
 # --- API ENDPOINTS ---
 @app.post("/api/alerts/create")
-def create_alert(alert: AlertCreate, db: Session = Depends(get_db)):
+def create_alert(alert: AlertCreate, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    require_same_user(alert.user_id, current_user)
     new_alert = models.Alert(
         user_id=alert.user_id,
         symbol=alert.symbol,
@@ -351,19 +673,39 @@ def create_alert(alert: AlertCreate, db: Session = Depends(get_db)):
     return {"message": f"Alert set for {alert.symbol} at {alert.target_price}"}
 
 @app.get("/api/alerts/{user_id}")
-def get_user_alerts(user_id: int, db: Session = Depends(get_db)):
+def get_user_alerts(user_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    require_same_user(user_id, current_user)
     return db.query(models.Alert).filter(models.Alert.user_id == user_id).all()
 
 # START THE LOOP ON STARTUP
 @app.on_event("startup")
 async def startup_event():
+    if CREATE_TABLES_ON_STARTUP:
+        create_tables()
     # Run the check loop in background
     asyncio.create_task(check_price_alerts())
+    email_sender.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    email_sender.stop()
+    prediction_jobs.shutdown()
+    sentiment_scorer.shutdown()
+    password_hasher.shutdown()
+    compare_executor.shutdown(wait=False)
+    alert_fetch_executor.shutdown(wait=False)
+    alert_cycle_executor.shutdown(wait=False)
 
 @app.get("/api/stocks/compare")
-def compare_stocks(symbol1: str, symbol2: str):
-    data1 = get_stock_info_internal(symbol1)
-    data2 = get_stock_info_internal(symbol2)
+def compare_stocks(symbol1: Optional[str] = None, symbol2: Optional[str] = None, symbols: Optional[str] = None):
+    # ?symbols=A,B,C compares up to 20 stocks; symbol1/symbol2 keeps the original pairwise response
+    if symbols:
+        return compare_many(parse_symbols(symbols, MAX_COMPARE_SYMBOLS))
+    if not symbol1 or not symbol2:
+        raise HTTPException(status_code=400, detail="Provide symbols=... or symbol1 and symbol2")
+    
+    # Both lookups are independent network calls, run them side by side
+    data1, data2 = compare_executor.map(get_stock_info_internal, [symbol1, symbol2])
 
     if not data1 or not data2:
         raise HTTPException(status_code=404, detail="One or both stocks not found")
@@ -381,6 +723,40 @@ def compare_stocks(symbol1: str, symbol2: str):
         "winner": winner
     }
 
+def compare_many(symbol_list):
+    results = list(compare_executor.map(get_stock_info_internal, symbol_list))
+    stocks = [data for data in results if data]
+    missing = [symbol for symbol, data in zip(symbol_list, results) if not data]
+    if not stocks:
+        raise HTTPException(status_code=404, detail="None of the stocks were found")
+    
+    # Ranking: score first, today's move breaks ties
+    ranked = sorted(stocks, key=lambda d: (d["score"], d["changePercent"]), reverse=True)
+    ranking = [{"rank": i + 1, "symbol": d["symbol"], "score": d["score"]} for i, d in enumerate(ranked)]
+    winner = "Tie" if len(ranked) > 1 and ranked[0]["score"] == ranked[1]["score"] else ranked[0]["symbol"]
+    
+    # Close series on one date index (the 6mo frames are already in the cache from the lookups above)
+    closes = {}
+    for data in stocks:
+        hist = get_stock_history(data["symbol"], "6mo")
+        if not hist.empty:
+            closes[data["symbol"]] = pd.Series(hist["Close"].to_numpy(), index=day_keys(hist.index))
+    corr_symbols = list(closes)
+    matrix, overlap = returns_correlation(pd.DataFrame(closes))
+    
+    return {
+        "stocks": stocks,
+        "ranking": ranking,
+        "winner": winner,
+        "correlation": {
+            "symbols": corr_symbols,
+            "matrix": [[None if np.isnan(v) else round(float(v), 4) for v in row] for row in matrix],
+            # Days of returns each pair had in common; a null coefficient means too few of them
+            "overlap": overlap.tolist()
+        },
+        "missing": missing
+    }
+
 @app.get("/")
 def home():
     return {"message": "AI Stock Prediction API is Running"}
@@ -389,29 +765,28 @@ def home():
 # ==========================
 
 @app.post("/api/auth/forgot-password")
-async def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db)):
-    print(f"\n🔑 Password reset requested for: {request.email}")
+def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db)):
+    auth_log.info("Password reset requested", extra={"email": request.email})
     
     # Check if user exists
     user = db.query(models.User).filter(models.User.email == request.email).first()
     if not user:
-        print(f"   ⚠️ No user found with email: {request.email}")
+        auth_log.info("No user found for password reset", extra={"email": request.email})
         # For security, don't reveal if the email exists or not
         return {"detail": "If an account exists with this email, you will receive a password reset link."}
     
-    print(f"   ✅ User found: {user.full_name} (ID: {user.id})")
-    
     try:
         # Generate a secure token
         token = secrets.token_urlsafe(32)
         
-        # Store the token (in production, store in database)
-        password_reset_tokens[user.email] = {
-            "token": token,
-            "expires": datetime.utcnow() + timedelta(hours=24)  # Token valid for 24 hours
-        }
+        # Store the token; a new request replaces the user's previous one
+        previous_token = ephemeral_store.get(f"reset-user:{user.email}")
+        if previous_token:
+            ephemeral_store.delete(f"reset:{previous_token}")
+        ephemeral_store.set(f"reset:{token}", user.email, RESET_TOKEN_TTL)
+        ephemeral_store.set(f"reset-user:{user.email}", token, RESET_TOKEN_TTL)
         
-        print(f"   🔑 Generated reset token for user ID: {user.id}")
+        auth_log.info("Generated reset token", extra={"userId": user.id})
         
         # Create reset link (make sure this matches your frontend route)
         reset_link = f"http://localhost:5173/reset-password?token={token}"
@@ -456,24 +831,24 @@ async def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(
         email_sent = send_email_notification(user.email, subject, body)
         
         if email_sent:
-            print(f"   ✅ Password reset email sent to {user.email}")
+            auth_log.info("Password reset email queued", extra={"userId": user.id})
             return {"detail": "If an account exists with this email, you will receive a password reset link."}
         else:
-            print(f"   ❌ Failed to send password reset email to {user.email}")
+            auth_log.error("Failed to queue password reset email", extra={"userId": user.id})
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to send password reset email. Please try again later."
             )
             
-    except Exception as e:
-        print(f"   ❌ Error in password reset process: {str(e)}")
+    except Exception:
+        auth_log.exception("Error in password reset process")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while processing your request. Please try again later."
         )
 
 @app.post("/api/auth/reset-password")
-async def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
+def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
     """
     Reset the user's password using a valid reset token.
     """
@@ -484,14 +859,8 @@ async def reset_password(request: ResetPasswordRequest, db: Session = Depends(ge
             detail="New password and confirmation do not match"
         )
     
-    # Find the token in our in-memory storage
-    user_email = None
-    for email, token_data in password_reset_tokens.items():
-        if token_data["token"] == request.token:
-            # Check if token is expired (24 hours)
-            if datetime.utcnow() < token_data["expires"]:
-                user_email = email
-            break
+    # Look the token up directly; expired tokens read as missing
+    user_email = ephemeral_store.get(f"reset:{request.token}")
     
     if not user_email:
         raise HTTPException(
@@ -509,12 +878,18 @@ async def reset_password(request: ResetPasswordRequest, db: Session = Depends(ge
     
     # Update the password
     hashed_password = get_password_hash(request.new_password)
+
+    # Redeem the token only now, so a busy hasher doesn't burn it; pop lets just one concurrent reset through
+    if ephemeral_store.pop(f"reset:{request.token}") != user_email:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid or expired token"
+        )
+    ephemeral_store.delete(f"reset-user:{user_email}")
+
     user.password_hash = hashed_password
     db.commit()
     
-    # Remove the used token
-    password_reset_tokens.pop(user_email, None)
-    
     return {"message": "Password has been reset successfully. You can now log in with your new password."}
 
 # ==========================
@@ -546,41 +921,48 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
 
 @app.post("/api/auth/login")
 def login(user: UserLogin, db: Session = Depends(get_db)):
-    print(f"DEBUG: Login attempt for email: {user.email}")
+    auth_log.debug("Login attempt", extra={"email": user.email})
     
     # 1. Find user by email
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     
     if not db_user:
-        print(f"DEBUG: User not found in database")
+        auth_log.debug("Login failed: user not found", extra={"email": user.email})
         raise HTTPException(status_code=400, detail="Invalid email or password")
     
-    print(f"DEBUG: User found: {db_user.email}")
-    
     # 2. Verify password
     password_valid = verify_password(user.password, db_user.password_hash)
-    print(f"DEBUG: Password verification result: {password_valid}")
     
     if not password_valid:
+        auth_log.debug("Login failed: wrong password", extra={"userId": db_user.id})
         raise HTTPException(status_code=400, detail="Invalid email or password")
     
-    # 3. Return success
-    print(f"DEBUG: Login successful for {db_user.email}")
+    # 3. Return success, with tokens so later requests skip bcrypt and the user lookup
+    auth_log.debug("Login successful", extra={"userId": db_user.id})
+    user_data = {
+        "id": db_user.id,
+        "email": db_user.email,
+        "full_name": db_user.full_name
+    }
     return {
         "message": "Login successful",
-        "user": {
-            "id": db_user.id,
-            "email": db_user.email,
-            "full_name": db_user.full_name
-        }
+        "user": user_data,
+        **create_token_pair(user_data, db_user.password_hash)
     }
 
+@app.post("/api/auth/refresh")
+def refresh_tokens(request: RefreshRequest, db: Session = Depends(get_db)):
+    # Refused once the password has changed since the refresh token was issued
+    user_data, db_user = verify_refresh_token(request.refresh_token, db)
+    return {"user": user_data, **create_token_pair(user_data, db_user.password_hash)}
+
 # ==========================
 #  USER PROFILE ENDPOINTS
 # ==========================
 
 @app.put("/api/auth/profile/{user_id}")
-def update_profile(user_id: int, user_update: UserUpdate, db: Session = Depends(get_db)):
+def update_profile(user_id: int, user_update: UserUpdate, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    require_same_user(user_id, current_user)
     # 1. Get the current user
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if not db_user:
@@ -605,25 +987,17 @@ def update_profile(user_id: int, user_update: UserUpdate, db: Session = Depends(
     db.commit()
     db.refresh(db_user)
     
-    return {"message": "Profile updated successfully", "user": {"id": db_user.id, "email": db_user.email, "full_name": db_user.full_name}}
+    user_data = {"id": db_user.id, "email": db_user.email, "full_name": db_user.full_name}
+    # Name and email live in the token claims, and a new password revokes the old tokens, so hand back a new pair
+    return {"message": "Profile updated successfully", "user": user_data,
+            **create_token_pair(user_data, db_user.password_hash)}
 #  STOCK MARKET ENDPOINTS
 # ==========================
 
 @app.get("/api/stocks/quote")
 def get_quote(symbol: str):
     try:
-        # --- FALLBACK DATA FOR COMMON SYMBOLS ---
-        fallback_data = {
-            "^NSEI": {"name": "NIFTY 50", "price": 19850.75, "change": 150.25, "changePercent": 0.76},
-            "^BSESN": {"name": "SENSEX", "price": 65800.50, "change": 250.30, "changePercent": 0.38},
-            "BTC-USD": {"name": "Bitcoin USD", "price": 42500.00, "change": 1200.00, "changePercent": 2.91},
-            "RELIANCE.NS": {"name": "Reliance Industries Ltd.", "price": 2850.30, "change": 25.60, "changePercent": 0.91},
-            "TCS.NS": {"name": "Tata Consultancy Services", "price": 3650.75, "change": 45.20, "changePercent": 1.25},
-            "HDFCBANK.NS": {"name": "HDFC Bank Ltd.", "price": 1585.40, "change": 12.30, "changePercent": 0.78},
-            "AAPL": {"name": "Apple Inc.", "price": 185.50, "change": 2.30, "changePercent": 1.25},
-            "TSLA": {"name": "Tesla Inc.", "price": 245.80, "change": -3.20, "changePercent": -1.28},
-            "NVDA": {"name": "NVIDIA Corporation", "price": 485.60, "change": 8.40, "changePercent": 1.76}
-        }
+        fallback_data = FALLBACK_QUOTES
         
         try:
             stock = fetch_stock_data(symbol)
@@ -631,6 +1005,7 @@ def get_quote(symbol: str):
             # If fetch_stock_data returned None, use fallback
             if stock is None:
                 if symbol.upper() in fallback_data:
+                    FALLBACK_SERVED.inc("quote")
                     fallback = fallback_data[symbol.upper()]
                     return {
                         "symbol": symbol.upper(),
@@ -651,11 +1026,12 @@ def get_quote(symbol: str):
                 raise HTTPException(status_code=404, detail="Stock not found")
             
             # Get 5 days of history first
-            history = stock.history(period="5d")
+            history = get_stock_history(symbol, "5d", stock=stock)
             
             if history.empty:
                 # Use fallback data if history is empty
                 if symbol.upper() in fallback_data:
+                    FALLBACK_SERVED.inc("quote")
                     fallback = fallback_data[symbol.upper()]
                     return {
                         "symbol": symbol.upper(),
@@ -683,9 +1059,9 @@ def get_quote(symbol: str):
 
             # Try to get info, but handle errors gracefully
             try:
-                info = stock.info
+                info = call_yahoo("info", symbol, _ticker_info, stock) or {}
             except Exception as e:
-                print(f"Error getting stock info for {symbol}: {e}")
+                fetch_log.info("Error getting stock info for %s: %s", symbol, e)
                 info = {}
 
             # --- MANUAL DESCRIPTIONS FOR INDICES ---
@@ -717,9 +1093,10 @@ def get_quote(symbol: str):
                 "website": info.get("website", "#")
             }
         except Exception as e:
-            print(f"Primary fetch failed for {symbol}, using fallback: {e}")
+            fetch_log.warning("Primary fetch failed for %s, using fallback: %s", symbol, e)
             # Use fallback data if primary fetch fails
             if symbol.upper() in fallback_data:
+                FALLBACK_SERVED.inc("quote")
                 fallback = fallback_data[symbol.upper()]
                 return {
                     "symbol": symbol.upper(),
@@ -740,50 +1117,139 @@ def get_quote(symbol: str):
             raise HTTPException(status_code=500, detail=f"Unable to fetch data for {symbol}")
             
     except Exception as e:
-        print(f"Error fetching quote for {symbol}: {e}")
+        logger.warning("Error fetching quote for %s: %s", symbol, e)
         raise HTTPException(status_code=500, detail=str(e))
 
+def parse_symbols(symbols: str, limit: int = MAX_BATCH_SYMBOLS):
+    # Comma separated list, e.g. ?symbols=^NSEI,^BSESN,BTC-USD
+    symbol_list = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+    if not symbol_list:
+        raise HTTPException(status_code=400, detail="No symbols provided")
+    if len(symbol_list) > limit:
+        raise HTTPException(status_code=400, detail=f"A maximum of {limit} symbols is allowed")
+    return symbol_list
+
+@app.get("/api/stocks/quotes")
+def get_quotes(symbols: str):
+    symbol_list = parse_symbols(symbols)
+    quotes = get_bulk_quotes(symbol_list).to_dict("index")
+    
+    results = []
+    for symbol in symbol_list:
+        quote = quotes.get(symbol)
+        if quote is not None and not pd.isna(quote["price"]):
+            results.append({
+                "symbol": symbol,
+                "price": quote["price"],
+                "prevClose": quote["prevClose"],
+                "change": quote["change"],
+                "changePercent": quote["changePercent"],
+                "volume": int(quote["volume"])
+            })
+        elif symbol in FALLBACK_QUOTES:
+            FALLBACK_SERVED.inc("quotes")
+            fallback = FALLBACK_QUOTES[symbol]
+            results.append({
+                "symbol": symbol,
+                "price": fallback["price"],
+                "prevClose": fallback["price"] - fallback["change"],
+                "change": fallback["change"],
+                "changePercent": fallback["changePercent"],
+                "volume": 0,
+                "name": fallback["name"]
+            })
+        else:
+            results.append({"symbol": symbol, "error": "Stock not found"})
+    return results
+
+# --- STREAMING QUOTES (Server-Sent Events) ---
+def get_stream_quotes(symbols):
+    """Quotes for the stream tick from one fetch of the 5d frames, whose last bar is today's live one"""
+    # Runs on the hub's poller thread, not a request thread, so failed fetches may wait and retry. It skips the
+    # cache (whose 5d entries live for a minute) and refreshes it, so every tick sees the latest price.
+    quotes = get_bulk_quotes(symbols, backoff=True, fresh=True)
+    quotes = quotes[quotes["price"].notna()]
+    
+    now = datetime.utcnow().isoformat() + "Z"
+    return {
+        symbol: {
+            "symbol": symbol,
+            "price": row["price"],
+            "prevClose": row["prevClose"],
+            "change": row["change"],
+            "changePercent": row["changePercent"],
+            "volume": int(row["volume"]),
+            "time": now
+        }
+        for symbol, row in quotes.to_dict("index").items()
+    }
+
+# Each tick is one live request per symbol; Yahoo's quotes don't move meaningfully faster than this
+quote_hub = QuoteStreamHub(get_stream_quotes, interval=float(os.getenv("QUOTE_STREAM_INTERVAL", 15)))
+
+@app.get("/api/stocks/stream")
+async def stream_quotes(symbols: str, request: Request):
+    # EventSource('/api/stocks/stream?symbols=AAPL,TSLA'); every browser shares the same upstream poll
+    symbol_list = parse_symbols(symbols)
+    queue = quote_hub.subscribe(symbol_list)
+    
+    async def events():
+        try:
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    quote = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: quote\ndata: {json.dumps(quote)}\n\n"
+        finally:
+            quote_hub.unsubscribe(queue, symbol_list)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/stocks/history")
-def get_history(symbol: str, range: str = "6mo"):
+def get_history(symbol: str, range: str = "6mo", format: str = "rows"):
     period_map = {"1d": "1d", "1w": "5d", "1m": "1mo", "6mo": "6mo", "1y": "1y", "5y": "5y"}
     p = period_map.get(range, "6mo")
     
     try:
-        stock = fetch_stock_data(symbol)
-        hist = stock.history(period=p)
+        hist = get_stock_history(symbol, p)
         
         if hist.empty:
             # Return fallback mock data for common symbols
             fallback_data = get_fallback_history_data(symbol, p)
-            return fallback_data
+            return rows_to_columns(fallback_data) if format == "columnar" else fallback_data
         
         # --- CALCULATE INDICATORS ---
+        # Only bars newer than the engine's state are folded in
+        indicator_engine.sync(symbol, hist)
+        
         # SMA 20 (Short term trend - Yellow Line)
-        hist['SMA_20'] = hist['Close'].rolling(window=20).mean()
+        hist['SMA_20'] = indicator_engine.sma(symbol, hist.index, 20)
         
         # SMA 50 (Medium term trend - Blue Line)
-        hist['SMA_50'] = hist['Close'].rolling(window=50).mean()
+        hist['SMA_50'] = indicator_engine.sma(symbol, hist.index, 50)
         
-        data = []
-        for date, row in hist.iterrows():
-            data.append({
-                "date": date.strftime('%Y-%m-%d'),
-                "open": row['Open'],
-                "high": row['High'],
-                "low": row['Low'],
-                "close": row['Close'],
-                "volume": row['Volume'],
-                "sma20": 0 if pd.isna(row['SMA_20']) else row['SMA_20'], # Handle NaN for first 20 days
-                "sma50": 0 if pd.isna(row['SMA_50']) else row['SMA_50']
-            })
-        return data
+        # ?format=columnar returns parallel arrays instead of one object per bar.
+        # They are already plain Python lists, so skip the per-item jsonable_encoder walk.
+        if format == "columnar":
+            return JSONResponse(content=history_columns(hist))
+        return history_rows(hist)
     except Exception as e:
-        print(f"Error fetching history for {symbol}: {e}")
+        logger.warning("Error fetching history for %s: %s", symbol, e)
         # Return fallback data instead of empty array
-        return get_fallback_history_data(symbol, p)
+        fallback_data = get_fallback_history_data(symbol, p)
+        return rows_to_columns(fallback_data) if format == "columnar" else fallback_data
 
 def get_fallback_history_data(symbol: str, period: str):
     """Generate fallback history data for common symbols when yfinance fails"""
+    FALLBACK_SERVED.inc("history")
     import random
     from datetime import datetime, timedelta
     
@@ -830,143 +1296,46 @@ def get_fallback_history_data(symbol: str, period: str):
 @app.get("/api/stocks/predict")
 def predict_stock(symbol: str):
     try:
-        stock = fetch_stock_data(symbol)
         # Fetch 2 years of data for training
-        hist = stock.history(period="2y") 
+        hist = get_stock_history(symbol, "2y")
         
         if hist.empty:
             raise HTTPException(status_code=404, detail="Not enough data to predict")
             
-        # --- 1. Technical Indicators ---
-        current_rsi = calculate_rsi(hist)
-        
-        # Calculate SMA_50
-        hist['SMA_50'] = hist['Close'].rolling(window=50).mean()
-        current_sma = hist['SMA_50'].iloc[-1]
-        current_price = hist['Close'].iloc[-1]
-
-        # --- 2. AI Model Training ---
-        hist = hist.reset_index()
-        hist['Date_Ordinal'] = hist['Date'].map(datetime.toordinal)
-        
-        # Clean data (remove NaNs caused by indicators)
-        hist = hist.dropna()
-        
-        X = hist[['Date_Ordinal']]
-        y = hist['Close']
-
-        # Model A: Linear Regression (Simple Trend)
-        lr_model = LinearRegression()
-        lr_model.fit(X, y)
-        
-        # Model B: Random Forest (Complex Patterns)
-        rf_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        rf_model.fit(X, y)
-
-        last_date = hist['Date'].iloc[-1]
-        last_ordinal = last_date.toordinal()
-        
-        predictions = []
-        next_day_price = 0
-        
-        # --- 3. Generate Forecast ---
-        # Short-Term (30 days)
-        for i in range(1, 31):
-            next_date_ordinal = last_ordinal + i
-            lr_pred = lr_model.predict([[next_date_ordinal]])[0]
-            rf_pred = rf_model.predict([[next_date_ordinal]])[0]
-            
-            # Weighted Average (Give slightly more weight to Random Forest)
-            avg_price = (lr_pred * 0.4) + (rf_pred * 0.6)
-            
-            next_date = last_date + timedelta(days=i)
-            predictions.append({
-                "date": next_date.strftime('%Y-%m-%d'),
-                "value": round(avg_price, 2)
-            })
-            if i == 1:
-                next_day_price = avg_price
-
-        # Long-Term
-        long_term_intervals = [30, 180, 365]
-        long_term_forecast = {}
-        
-        for days in long_term_intervals:
-            future_ordinal = last_ordinal + days
-            lr_pred = lr_model.predict([[future_ordinal]])[0]
-            rf_pred = rf_model.predict([[future_ordinal]])[0]
-            avg_price = (lr_pred + rf_pred) / 2
-            
-            key_name = "1y" if days == 365 else "6mo" if days == 180 else "1mo"
-            long_term_forecast[key_name] = round(avg_price, 2)
-
-        # --- 4. CALCULATE CONFIDENCE SCORE ---
-        # Get predictions for "tomorrow" from both models
-        tom_lr = lr_model.predict([[last_ordinal + 1]])[0]
-        tom_rf = rf_model.predict([[last_ordinal + 1]])[0]
-        
-        # Difference percentage
-        diff_percent = abs(tom_lr - tom_rf) / current_price
-        
-        # Simple Confidence Logic:
-        # If difference < 1%, Confidence = 90-100%
-        # If difference > 5%, Confidence drops
-        confidence_score = max(10, min(98, 100 - (diff_percent * 400))) # 400 is an arbitrary scaling factor
-        
-        # --- 5. AI VERDICT ---
-        verdict = "HOLD" 
-        reason = "Market is stable."
-
-        ai_signal = "Bullish" if next_day_price > current_price else "Bearish"
-        
-        if current_rsi < 30:
-            rsi_signal = "Oversold"
-        elif current_rsi > 70:
-            rsi_signal = "Overbought"
-        else:
-            rsi_signal = "Neutral"
-
-        # Smarter Logic combining Price + RSI + Confidence
-        if ai_signal == "Bullish":
-            if current_rsi < 45: 
-                 verdict = "STRONG BUY"
-                 reason = "Price expected to rise & stock is cheap (RSI low)."
-            elif current_rsi < 70:
-                 verdict = "BUY"
-                 reason = f"AI predicts uptrend (Confidence: {int(confidence_score)}%)."
-            else:
-                 verdict = "HOLD"
-                 reason = "Price rising, but stock is expensive (Overbought)."
-        else: # Bearish
-            if current_rsi > 70:
-                verdict = "STRONG SELL"
-                reason = "Price dropping & stock is too expensive."
-            elif current_rsi > 55:
-                verdict = "SELL"
-                reason = "AI predicts downtrend."
-            else:
-                verdict = "HOLD"
-                reason = "Price dropping, but selling now might be late."
-
-        final_rsi = 50.0 if np.isnan(current_rsi) else round(current_rsi, 2)
-        final_sma = 0.0 if np.isnan(current_sma) else round(current_sma, 2)
-
-        return {
-            "symbol": symbol,
-            "currentPrice": current_price,
-            "nextClose": round(next_day_price, 2),
-            "trend": ai_signal,
-            "rsi": final_rsi,
-            "sma": final_sma,
-            "verdict": verdict,
-            "reason": reason,
-            "confidence": int(confidence_score), # <--- SENDING CONFIDENCE
-            "series": predictions,
-            "longTerm": long_term_forecast
-        }
+        indicator_engine.sync(symbol, hist)
+        with PREDICTION_SECONDS.time():
+            return build_prediction(symbol, hist, indicator_engine.latest(symbol))
     except Exception as e:
-        print(f"Error predicting for {symbol}: {e}")
+        logger.exception("Error predicting for %s", symbol)
         raise HTTPException(status_code=500, detail=str(e))
+
+# --- Job based prediction: training runs in a process pool, the client polls for the result ---
+def load_prediction_inputs(symbol: str):
+    hist = get_stock_history(symbol, "2y")
+    if hist.empty:
+        return hist, None
+    indicator_engine.sync(symbol, hist)
+    return hist, indicator_engine.latest(symbol)
+
+prediction_jobs = PredictionJobs(load_prediction_inputs, ephemeral_store)
+
+@app.post("/api/stocks/predict/jobs", status_code=status.HTTP_202_ACCEPTED)
+def create_prediction_job(request: PredictionJobCreate):
+    job = prediction_jobs.submit(request.symbol)
+    return {"jobId": job["jobId"], "symbol": job["symbol"], "status": job["status"]}
+
+@app.get("/api/stocks/predict/jobs/{job_id}")
+def get_prediction_job(job_id: str):
+    job = prediction_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    response = {"jobId": job["jobId"], "symbol": job["symbol"], "status": job["status"]}
+    if job["status"] == "DONE":
+        response["result"] = job["result"]
+    elif job["status"] == "FAILED":
+        response["error"] = job["error"]
+    return response
     
 
 # ==========================
@@ -974,7 +1343,8 @@ def predict_stock(symbol: str):
 # ==========================
 
 @app.post("/api/watchlist/add")
-def add_to_watchlist(item: WatchlistAdd, db: Session = Depends(get_db)):
+def add_to_watchlist(item: WatchlistAdd, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    require_same_user(item.user_id, current_user)
     # 1. Check if already added
     exists = db.query(models.Watchlist).filter(
         models.Watchlist.user_id == item.user_id,
@@ -997,12 +1367,14 @@ def add_to_watchlist(item: WatchlistAdd, db: Session = Depends(get_db)):
     return {"message": "Added to portfolio"}
 
 @app.get("/api/watchlist/{user_id}")
-def get_watchlist(user_id: int, db: Session = Depends(get_db)):
+def get_watchlist(user_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    require_same_user(user_id, current_user)
     items = db.query(models.Watchlist).filter(models.Watchlist.user_id == user_id).all()
     return items
 
 @app.delete("/api/watchlist/{user_id}/{symbol}")
-def remove_from_watchlist(user_id: int, symbol: str, db: Session = Depends(get_db)):
+def remove_from_watchlist(user_id: int, symbol: str, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    require_same_user(user_id, current_user)
     item = db.query(models.Watchlist).filter(
         models.Watchlist.user_id == user_id,
         models.Watchlist.symbol == symbol
@@ -1015,10 +1387,107 @@ def remove_from_watchlist(user_id: int, symbol: str, db: Session = Depends(get_d
     db.commit()
     return {"message": "Removed from watchlist"}
 
+# ==========================
+#  PORTFOLIO ENDPOINTS
+# ==========================
+
+def _json_floats(values):
+    # NaN (unpriced holding) is not valid JSON
+    return [None if np.isnan(v) else round(float(v), 4) for v in values]
+
+@app.get("/api/portfolio/{user_id}/valuation")
+def get_portfolio_valuation(user_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    require_same_user(user_id, current_user)
+    # 1. All holdings in one query, only the columns we need
+    holdings = db.query(
+        models.Watchlist.symbol, models.Watchlist.quantity, models.Watchlist.buy_price
+    ).filter(models.Watchlist.user_id == user_id).all()
+    
+    if not holdings:
+        return {
+            "userId": user_id,
+            "holdings": [],
+            "totals": {"marketValue": 0.0, "costBasis": 0.0, "unrealizedPnl": 0.0, "unrealizedPnlPercent": 0.0,
+                       "dayChange": 0.0, "dayChangePercent": 0.0, "priced": 0, "unpriced": 0}
+        }
+    
+    symbols = [h.symbol.upper() for h in holdings]
+    quantity = np.array([h.quantity or 0 for h in holdings], dtype=float)
+    buy_price = np.array([h.buy_price or 0.0 for h in holdings], dtype=float)
+    
+    # 2. One batched price lookup for every distinct symbol
+    quotes = get_bulk_quotes(list(dict.fromkeys(symbols)))
+    price = quotes["price"].reindex(symbols).to_numpy(dtype=float)
+    prev_close = quotes["prevClose"].reindex(symbols).to_numpy(dtype=float)
+    priced = ~np.isnan(price)
+    
+    # 3. Valuation as array operations over all holdings
+    market_value = quantity * price
+    cost_basis = quantity * buy_price
+    unrealized_pnl = market_value - cost_basis
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unrealized_pnl_percent = np.where(cost_basis != 0, unrealized_pnl / cost_basis * 100, 0.0)
+        day_change = quantity * (price - prev_close)
+        day_change_percent = np.where(prev_close != 0, (price - prev_close) / prev_close * 100, 0.0)
+    
+    total_value = float(np.nansum(market_value))
+    total_cost = float(cost_basis[priced].sum())
+    total_pnl = float(np.nansum(unrealized_pnl))
+    total_day_change = float(np.nansum(day_change))
+    previous_value = total_value - total_day_change
+    weights = np.where(priced, market_value / total_value * 100, 0.0) if total_value else np.zeros(len(symbols))
+    
+    columns = {
+        "price": _json_floats(price),
+        "marketValue": _json_floats(market_value),
+        "costBasis": _json_floats(cost_basis),
+        "unrealizedPnl": _json_floats(unrealized_pnl),
+        "unrealizedPnlPercent": _json_floats(unrealized_pnl_percent),
+        "dayChange": _json_floats(day_change),
+        "dayChangePercent": _json_floats(day_change_percent),
+        "weight": _json_floats(weights),
+    }
+    rows = []
+    for i, h in enumerate(holdings):
+        row = {"symbol": symbols[i], "quantity": h.quantity, "buyPrice": h.buy_price, "priced": bool(priced[i])}
+        row.update({key: values[i] for key, values in columns.items()})
+        rows.append(row)
+    
+    return {
+        "userId": user_id,
+        "holdings": rows,
+        "totals": {
+            "marketValue": round(total_value, 2),
+            "costBasis": round(total_cost, 2),
+            "unrealizedPnl": round(total_pnl, 2),
+            "unrealizedPnlPercent": round(total_pnl / total_cost * 100, 2) if total_cost else 0.0,
+            "dayChange": round(total_day_change, 2),
+            "dayChangePercent": round(total_day_change / previous_value * 100, 2) if previous_value else 0.0,
+            "priced": int(priced.sum()),
+            "unpriced": int((~priced).sum())
+        }
+    }
+
 # ==========================
 #  NEWS & SENTIMENT ENDPOINTS
 # ==========================
 
+NEWS_HEADLINES = 6
+news_cache = NewsCache()
+news_flight = SingleFlight("news")
+sentiment_scorer = SentimentScorer()
+
+def fetch_news_list(search_term):
+    news_list = call_yahoo("news", search_term, _ticker_news, search_term)
+
+    # Fallback: If specific news is empty, fetch general market news
+    if not news_list:
+        news_list = call_yahoo("news", "SPY", _ticker_news, "SPY") # SPY usually has general market news
+
+    news_list = news_list or []
+    news_cache.put(search_term, news_list)
+    return news_list
+
 @app.get("/api/stocks/news")
 def get_stock_news(symbol: str = "AAPL"):
     try:
@@ -1029,46 +1498,35 @@ def get_stock_news(symbol: str = "AAPL"):
         elif symbol == "BTC-USD":
             search_term = "Bitcoin"
 
-        # 2. Try fetching news
-        stock = yf.Ticker(search_term)
-        news_list = stock.news
-        
-        # Fallback: If specific news is empty, fetch general market news
-        if not news_list:
-            stock = yf.Ticker("SPY") # SPY usually has general market news
-            news_list = stock.news
+        # 2. Reuse recent news for this term, concurrent misses share one Yahoo call
+        news_list = news_cache.get(search_term)
+        if news_list is None:
+            news_list = news_flight.do(search_term, fetch_news_list, search_term)
 
-        processed_news = []
-        
-        for article in news_list[:6]: # Get top 6
-            title = article.get("title", "No Title")
-            link = article.get("link", "#")
-            publisher = article.get("publisher", "Unknown")
-            
-            # Skip articles with no title
-            if title == "No Title":
-                continue
+        # Get top 6, skipping articles with no title
+        articles = [a for a in news_list[:NEWS_HEADLINES] if a.get("title", "No Title") != "No Title"]
 
-            # Analyze sentiment
-            analysis = TextBlob(title)
-            sentiment_score = analysis.sentiment.polarity
-            
+        # 3. Analyze sentiment; headlines seen before come from the memo, the rest are scored in one batch
+        scores = sentiment_scorer.polarities([a["title"] for a in articles])
+
+        processed_news = []
+        for article, sentiment_score in zip(articles, scores):
             if sentiment_score > 0.1:
                 sentiment = "Positive"
             elif sentiment_score < -0.1:
                 sentiment = "Negative"
             else:
                 sentiment = "Neutral"
-                
+
             processed_news.append({
-                "title": title,
-                "link": link,
-                "publisher": publisher,
+                "title": article["title"],
+                "link": article.get("link", "#"),
+                "publisher": article.get("publisher", "Unknown"),
                 "sentiment": sentiment
             })
-            
+
         return processed_news
-        
+
     except Exception as e:
-        print(f"Error fetching news for {symbol}: {e}")
-        return []
\ No newline at end of file
+        logger.warning("Error fetching news for %s: %s", symbol, e)
+        return []
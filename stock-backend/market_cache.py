@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+# --- TTL per range ---
+# Short ranges are effectively "quotes" and go stale within seconds,
+# long daily ranges only change once per trading day.
+PERIOD_TTL_SECONDS = {
+    "1d": 15,
+    "5d": 60,
+    "1mo": 5 * 60,
+    "3mo": 15 * 60,
+    "6mo": 30 * 60,
+    "1y": 60 * 60,
+    "2y": 3 * 60 * 60,
+    "5y": 6 * 60 * 60,
+    "max": 6 * 60 * 60,
+}
+INTRADAY_TTL_SECONDS = 15
+DEFAULT_TTL_SECONDS = 60
+
+# Longer daily ranges can serve a shorter one by slicing the tail
+PERIOD_DAYS = {"1d": 1, "5d": 5, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827}
+# Yahoo counts these in trading days, not calendar days
+PERIOD_ROWS = {"1d": 1, "5d": 5}
+
+
+def ttl_for(period: str, interval: str = "1d") -> int:
+    """Returns how long a frame for this range may be served from cache"""
+    if interval not in ("1d", "5d", "1wk", "1mo", "3mo"):
+        return INTRADAY_TTL_SECONDS
+    return PERIOD_TTL_SECONDS.get(period, DEFAULT_TTL_SECONDS)
+
+
+def frame_size(frame) -> int:
+    try:
+        return int(frame.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return 0
+
+
+class OHLCVCache:
+    """Thread-safe LRU cache of OHLCV DataFrames keyed by (symbol, period, interval), bounded by bytes"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (frame, expires_at, size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(symbol: str, period: str, interval: str):
+        return (symbol.upper(), period, interval)
+
+    def _get_fresh(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        frame, expires_at, size = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self.current_bytes -= size
+            return None
+        self._entries.move_to_end(key)
+        return frame
+
+    def get(self, symbol: str, period: str, interval: str = "1d"):
+        """Returns a copy of the cached frame, or None. Daily ranges may be cut from a fresher longer range."""
+        key = self._key(symbol, period, interval)
+        now = time.monotonic()
+        with self._lock:
+            frame = self._get_fresh(key, now)
+            if frame is None and interval == "1d" and period in PERIOD_DAYS:
+                # e.g. a "6mo" request can reuse the "2y" frame predict_stock just pulled,
+                # as long as that frame is still within the shorter range's TTL
+                for longer, days in sorted(PERIOD_DAYS.items(), key=lambda kv: kv[1]):
+                    if days <= PERIOD_DAYS[period]:
+                        continue
+                    longer_key = self._key(symbol, longer, interval)
+                    entry = self._entries.get(longer_key)
+                    if entry is None:
+                        continue
+                    stored_at = entry[1] - ttl_for(longer, interval)
+                    if now - stored_at > ttl_for(period, interval):
+                        continue
+                    source = self._get_fresh(longer_key, now)
+                    if source is not None and len(source):
+                        if period in PERIOD_ROWS:
+                            frame = source.iloc[-PERIOD_ROWS[period]:]
+                            break
+                        cutoff = source.index[-1] - timedelta(days=PERIOD_DAYS[period])
+                        frame = source[source.index > cutoff]
+                        break
+
+            if frame is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Callers add indicator columns in place, never hand out the cached object
+            return frame.copy()
+
+    def put(self, symbol: str, period: str, frame, interval: str = "1d"):
+        if frame is None or frame.empty:
+            return
+        key = self._key(symbol, period, interval)
+        size = frame_size(frame)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl_for(period, interval)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[2]
+            self._entries[key] = (frame.copy(), expires_at, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+
+class TTLCache:
+    """Thread-safe LRU of small objects with one TTL for every entry, bounded by entry count.
+
+    Expired entries are dropped when read or when the oldest entries are evicted on insert.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, now + self.ttl)
+            while self._entries:
+                oldest_key, (_, expires_at) = next(iter(self._entries.items()))
+                if len(self._entries) <= self.max_entries and expires_at > now:
+                    break
+                del self._entries[oldest_key]
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,267 @@
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from indicators import latest_indicators, SMA_WINDOWS
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever features or hyperparameters change so stale models on disk are ignored
+MODEL_VERSION = "1"
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "stock-models"))
+MODEL_CACHE_MAX_ENTRIES = int(os.getenv("MODEL_CACHE_MAX_ENTRIES", 64))
+
+
+def train_models(X, y):
+    """Fits the trend (LinearRegression) and pattern (RandomForest) models on one training set"""
+    # sklearn is slow to import; only processes that actually train pay for it
+    from sklearn.linear_model import LinearRegression
+    from sklearn.ensemble import RandomForestRegressor
+
+    # Model A: Linear Regression (Simple Trend)
+    lr_model = LinearRegression()
+    lr_model.fit(X, y)
+
+    # Model B: Random Forest (Complex Patterns)
+    rf_model = RandomForestRegressor(n_estimators=100, random_state=42)
+    rf_model.fit(X, y)
+    return lr_model, rf_model
+
+
+def predict_horizons(lr_model, rf_model, last_ordinal, horizons):
+    """Scores every horizon (days after last_ordinal) in one batched predict call per model"""
+    X = (last_ordinal + np.asarray(horizons, dtype=np.int64)).reshape(-1, 1)
+    return lr_model.predict(X), rf_model.predict(X)
+
+
+class ModelCache:
+    """Trained models per (symbol, last bar date, model version), kept in memory and on disk"""
+
+    def __init__(self, cache_dir=MODEL_CACHE_DIR, max_entries=MODEL_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._training = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.trainings = 0
+
+    @staticmethod
+    def _safe_symbol(symbol):
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", symbol.upper())
+
+    def _path(self, symbol, last_date):
+        return os.path.join(self.cache_dir, f"{self._safe_symbol(symbol)}__{last_date}__v{MODEL_VERSION}.joblib")
+
+    def _remember(self, key, models):
+        with self._lock:
+            self._memory[key] = models
+            self._memory.move_to_end(key)
+            # A new daily bar makes every older model for this symbol obsolete
+            for old_key in [k for k in self._memory if k[0] == key[0] and k != key]:
+                del self._memory[old_key]
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _load(self, symbol, last_date):
+        path = self._path(symbol, last_date)
+        if not os.path.exists(path):
+            return None
+        try:
+            import joblib
+            return joblib.load(path)
+        except Exception as e:
+            logger.warning("Discarding unreadable model cache %s: %s", path, e)
+            return None
+
+    def _save(self, symbol, last_date, models):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(symbol, last_date)
+            # Write then rename so a concurrent reader never sees a half-written file
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            os.close(fd)
+            import joblib
+            joblib.dump(models, tmp_path)
+            os.replace(tmp_path, path)
+
+            prefix = f"{self._safe_symbol(symbol)}__"
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(prefix) and os.path.join(self.cache_dir, name) != path:
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+        except Exception as e:
+            logger.warning("Could not persist models for %s: %s", symbol, e)
+
+    def get_or_train(self, symbol, last_date, X, y):
+        """Returns (lr_model, rf_model) for the frame ending on last_date, training only on a miss"""
+        key = (symbol.upper(), str(last_date), MODEL_VERSION)
+        with self._lock:
+            models = self._memory.get(key)
+            if models is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return models
+            # One training per key, concurrent callers wait for it
+            event = self._training.get(key)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._training[key] = event
+
+        if not leader:
+            event.wait()
+            with self._lock:
+                models = self._memory.get(key)
+            if models is not None:
+                return models
+            return self.get_or_train(symbol, last_date, X, y)
+
+        try:
+            models = self._load(symbol, last_date)
+            if models is not None:
+                self.disk_hits += 1
+            else:
+                models = train_models(X, y)
+                self.trainings += 1
+                self._save(symbol, last_date, models)
+            self._remember(key, models)
+            return models
+        finally:
+            with self._lock:
+                self._training.pop(key, None)
+            event.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._memory),
+                "memoryHits": self.memory_hits,
+                "diskHits": self.disk_hits,
+                "trainings": self.trainings,
+                "version": MODEL_VERSION,
+            }
+
+
+model_cache = ModelCache()
+
+
+def build_prediction(symbol, hist, indicators=None):
+    """Indicators, forecast, confidence and verdict for a symbol's 2y daily history.
+
+    indicators is the latest {rsi, sma50, ...} from the shared engine; computed from hist when omitted.
+    """
+    # --- 1. Technical Indicators ---
+    if indicators is None:
+        indicators = latest_indicators(hist)
+    current_rsi = indicators["rsi"]
+    current_sma = indicators["sma50"]
+    current_price = hist['Close'].iloc[-1]
+
+    # --- 2. AI Model Training ---
+    hist = hist.reset_index()
+    hist['Date_Ordinal'] = hist['Date'].map(datetime.toordinal)
+
+    # Clean data (the SMA_50 warm-up bars have never been part of the training set)
+    hist = hist.iloc[max(SMA_WINDOWS) - 1:].dropna()
+
+    X = hist[['Date_Ordinal']]
+    y = hist['Close']
+
+    last_date = hist['Date'].iloc[-1]
+
+    # Models are reused until a new daily bar arrives
+    lr_model, rf_model = model_cache.get_or_train(symbol, last_date.strftime('%Y-%m-%d'), X, y)
+    last_ordinal = last_date.toordinal()
+
+    # --- 3. Generate Forecast ---
+    # Short-Term (30 days) and Long-Term horizons are scored together, one predict call per model
+    short_term_days = np.arange(1, 31)
+    long_term_intervals = [30, 180, 365]
+    lr_preds, rf_preds = predict_horizons(
+        lr_model, rf_model, last_ordinal, np.concatenate([short_term_days, long_term_intervals])
+    )
+    lr_short, rf_short = lr_preds[:len(short_term_days)], rf_preds[:len(short_term_days)]
+    lr_long, rf_long = lr_preds[len(short_term_days):], rf_preds[len(short_term_days):]
+
+    # Weighted Average (Give slightly more weight to Random Forest)
+    short_avg = (lr_short * 0.4) + (rf_short * 0.6)
+    predictions = [
+        {"date": (last_date + timedelta(days=int(i))).strftime('%Y-%m-%d'), "value": round(float(avg_price), 2)}
+        for i, avg_price in zip(short_term_days, short_avg)
+    ]
+    next_day_price = float(short_avg[0])
+
+    # Long-Term
+    long_avg = (lr_long + rf_long) / 2
+    long_term_forecast = {}
+    for days, avg_price in zip(long_term_intervals, long_avg):
+        key_name = "1y" if days == 365 else "6mo" if days == 180 else "1mo"
+        long_term_forecast[key_name] = round(float(avg_price), 2)
+
+    # --- 4. CALCULATE CONFIDENCE SCORE ---
+    # Predictions for "tomorrow" from both models (first row of the horizon batch)
+    tom_lr = lr_short[0]
+    tom_rf = rf_short[0]
+
+    # Difference percentage
+    diff_percent = abs(tom_lr - tom_rf) / current_price
+
+    # Simple Confidence Logic:
+    # If difference < 1%, Confidence = 90-100%
+    # If difference > 5%, Confidence drops
+    confidence_score = max(10, min(98, 100 - (diff_percent * 400))) # 400 is an arbitrary scaling factor
+
+    # --- 5. AI VERDICT ---
+    verdict = "HOLD" 
+    reason = "Market is stable."
+
+    ai_signal = "Bullish" if next_day_price > current_price else "Bearish"
+
+    # Smarter Logic combining Price + RSI + Confidence
+    if ai_signal == "Bullish":
+        if current_rsi < 45: 
+             verdict = "STRONG BUY"
+             reason = "Price expected to rise & stock is cheap (RSI low)."
+        elif current_rsi < 70:
+             verdict = "BUY"
+             reason = f"AI predicts uptrend (Confidence: {int(confidence_score)}%)."
+        else:
+             verdict = "HOLD"
+             reason = "Price rising, but stock is expensive (Overbought)."
+    else: # Bearish
+        if current_rsi > 70:
+            verdict = "STRONG SELL"
+            reason = "Price dropping & stock is too expensive."
+        elif current_rsi > 55:
+            verdict = "SELL"
+            reason = "AI predicts downtrend."
+        else:
+            verdict = "HOLD"
+            reason = "Price dropping, but selling now might be late."
+
+    final_rsi = 50.0 if np.isnan(current_rsi) else round(current_rsi, 2)
+    final_sma = 0.0 if np.isnan(current_sma) else round(current_sma, 2)
+
+    return {
+        "symbol": symbol,
+        "currentPrice": current_price,
+        "nextClose": round(next_day_price, 2),
+        "trend": ai_signal,
+        "rsi": final_rsi,
+        "sma": final_sma,
+        "verdict": verdict,
+        "reason": reason,
+        "confidence": int(confidence_score), # <--- SENDING CONFIDENCE
+        "series": predictions,
+        "longTerm": long_term_forecast
+    }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Text
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -35,4 +35,27 @@ class Alert(Base):
     status = Column(String(20), default="ACTIVE") # ACTIVE, TRIGGERED
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
-    owner = relationship("User", back_populates="alerts")
\ No newline at end of file
+    owner = relationship("User", back_populates="alerts")
+
+# --- EMAIL OUTBOX ---
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String(255))
+    subject = Column(String(255))
+    body = Column(Text)
+    status = Column(String(20), default="PENDING", index=True) # PENDING, SENDING, SENT, FAILED
+    attempts = Column(Integer, default=0)
+    last_error = Column(String(500))
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    sent_at = Column(DateTime)
+
+# --- EPHEMERAL KEY-VALUE (reset tokens, shared across workers) ---
+class EphemeralEntry(Base):
+    __tablename__ = "ephemeral_kv"
+
+    key = Column(String(255), primary_key=True)
+    value = Column(Text)
+    expires_at = Column(Float, index=True) # Unix time, rows past it are treated as missing and swept
@@ -0,0 +1,122 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+NEWS_CACHE_TTL = int(os.getenv("NEWS_CACHE_TTL", 300))
+SENTIMENT_MEMO_SIZE = int(os.getenv("SENTIMENT_MEMO_SIZE", 10000))
+SENTIMENT_WORKERS = int(os.getenv("SENTIMENT_WORKERS", 2))
+
+logger = logging.getLogger(__name__)
+
+
+def score_titles(titles):
+    """TextBlob polarity for a batch of headlines; runs inside a sentiment worker process"""
+    from textblob import TextBlob
+    return [TextBlob(title).sentiment.polarity for title in titles]
+
+
+def title_key(title):
+    return hashlib.sha1(title.strip().lower().encode("utf-8")).hexdigest()
+
+
+class NewsCache:
+    """Raw news lists per search term, reused for NEWS_CACHE_TTL seconds"""
+
+    def __init__(self, ttl=NEWS_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, key, news_list):
+        with self._lock:
+            now = time.monotonic()
+            # Drop expired terms so the dict doesn't grow with every symbol ever asked for
+            for stale in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[stale]
+            self._entries[key] = (now + self.ttl, news_list)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class SentimentScorer:
+    """Memoized headline polarity; only unseen headlines are scored, in one batch on a worker pool"""
+
+    def __init__(self, workers=SENTIMENT_WORKERS, memo_size=SENTIMENT_MEMO_SIZE):
+        self.workers = workers
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+        self.memo_hits = 0
+        self.scored = 0
+        self.batches = 0
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def polarities(self, titles):
+        keys = [title_key(title) for title in titles]
+        results = {}
+        missing = {}
+        with self._lock:
+            for key, title in zip(keys, titles):
+                if key in self._memo:
+                    self._memo.move_to_end(key)
+                    results[key] = self._memo[key]
+                    self.memo_hits += 1
+                else:
+                    missing[key] = title
+
+        if missing:
+            batch = list(missing.values())
+            try:
+                scores = self._executor().submit(score_titles, batch).result(timeout=30)
+            except Exception as e:
+                logger.warning("Sentiment pool unavailable, scoring inline: %s", e)
+                scores = score_titles(batch)
+            with self._lock:
+                self.batches += 1
+                self.scored += len(batch)
+                for key, score in zip(missing, scores):
+                    results[key] = score
+                    self._memo[key] = score
+                while len(self._memo) > self.memo_size:
+                    self._memo.popitem(last=False)
+
+        return [results[key] for key in keys]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "memoEntries": len(self._memo),
+                "memoHits": self.memo_hits,
+                "scored": self.scored,
+                "batches": self.batches,
+            }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
@@ -0,0 +1,270 @@
+import datetime
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from indicators import day_keys
+from market_cache import PERIOD_DAYS
+
+try:
+    import fcntl  # Serializes writes across gunicorn workers; not available on Windows
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+OHLCV_STORE_DIR = os.getenv("OHLCV_STORE_DIR", os.path.join(tempfile.gettempdir(), "ohlcv-store"))
+# Relative difference between a stored close and Yahoo's close for the same day that means history was re-based
+OHLCV_BASIS_TOLERANCE = float(os.getenv("OHLCV_BASIS_TOLERANCE", 1e-5))
+FIELDS = ("Open", "High", "Low", "Close", "Volume")
+
+
+class OHLCVStore:
+    """Completed daily bars on disk, one directory per symbol with one array file per column.
+
+    Files are raw little-endian arrays (dates as int64 days since epoch, prices as float64), so a read is a
+    memory map and a sync appends only the bars after the last stored date.
+
+    Yahoo's bars are split and dividend adjusted as of the day they are fetched, so stored and new bars only share
+    a price basis until the next corporate action. Every sync compares a bar the store already has with the same
+    day from Yahoo; when they differ the symbol is backfilled again into a new generation of files, and meta.json
+    switches to it in one atomic write.
+    """
+
+    def __init__(self, root=OHLCV_STORE_DIR, basis_tolerance=OHLCV_BASIS_TOLERANCE):
+        self.root = root
+        self.basis_tolerance = basis_tolerance
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self.backfills = 0
+        self.rebases = 0
+        self.delta_syncs = 0
+        self.appended_rows = 0
+        self.skipped_syncs = 0
+
+    # --- Layout ---
+    def _dir(self, symbol):
+        return os.path.join(self.root, re.sub(r"[^A-Za-z0-9_.-]", "_", symbol.upper()))
+
+    def _column_path(self, symbol, name, generation=0):
+        suffix = f".{generation}" if generation else ""
+        return os.path.join(self._dir(symbol), f"{name}{suffix}.bin")
+
+    def _meta_path(self, symbol):
+        return os.path.join(self._dir(symbol), "meta.json")
+
+    def _lock(self, symbol):
+        with self._locks_guard:
+            return self._locks.setdefault(symbol.upper(), threading.Lock())
+
+    @contextmanager
+    def _locked(self, symbol):
+        # Thread lock for this process, flock for the other workers; every meta read-modify-write happens inside
+        os.makedirs(self._dir(symbol), exist_ok=True)
+        with self._lock(symbol):
+            lock_file = open(os.path.join(self._dir(symbol), ".lock"), "w")
+            try:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    def _read_meta(self, symbol):
+        try:
+            with open(self._meta_path(symbol)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {"rows": 0, "lastSync": None}
+        meta.setdefault("generation", 0)
+        meta.setdefault("backfillPeriod", None)
+        return meta
+
+    def _write_meta(self, symbol, meta):
+        path = self._meta_path(symbol)
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir(symbol), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def _map(self, symbol, name, dtype, meta):
+        rows = meta["rows"]
+        path = self._column_path(symbol, name, meta["generation"])
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+
+    # --- Reads ---
+    def read(self, symbol, since=None):
+        """Stored bars as an OHLCV frame indexed by Date, optionally only from the `since` day on"""
+        # meta is written after the column files, so a torn append is never visible. A re-backfill removes the
+        # previous generation's files once meta points past them; a reader caught in between just reads again.
+        for attempt in range(2):
+            meta = self._read_meta(symbol)
+            try:
+                return self._read_frame(symbol, meta, since)
+            except FileNotFoundError:
+                if attempt:
+                    raise
+
+    def _read_frame(self, symbol, meta, since):
+        days = self._map(symbol, "Date", "<i8", meta)
+        start = 0
+        if since is not None and meta["rows"]:
+            start = int(np.searchsorted(days, np.datetime64(since, "D").astype("int64")))
+        index = pd.DatetimeIndex(np.asarray(days[start:]).astype("datetime64[D]"), name="Date")
+        data = {name: np.asarray(self._map(symbol, name, "<f8", meta)[start:]) for name in FIELDS}
+        frame = pd.DataFrame(data, index=index)
+        frame["Volume"] = frame["Volume"].astype("int64")
+        return frame
+
+    def _basis_changed(self, symbol, meta, frame):
+        """True when frame has the last stored day and its close differs from the stored one"""
+        if not meta["rows"] or frame is None or frame.empty:
+            return False
+        last = int(self._map(symbol, "Date", "<i8", meta)[-1])
+        match = np.flatnonzero(day_keys(frame.index).astype("int64") == last)
+        if not len(match):
+            return False
+        fetched = float(frame["Close"].iloc[match[-1]])
+        stored = float(self._map(symbol, "Close", "<f8", meta)[-1])
+        if np.isnan(fetched):
+            return False
+        return not np.isclose(fetched, stored, rtol=self.basis_tolerance, atol=0.0)
+
+    # --- Writes (callers hold _locked) ---
+    def _append(self, symbol, meta, frame):
+        days = day_keys(frame.index).astype("int64")
+        keep = np.ones(len(days), dtype=bool)
+        if meta["rows"]:
+            keep = days > int(self._map(symbol, "Date", "<i8", meta)[-1])
+        keep &= ~frame["Close"].isna().to_numpy()
+        if not keep.any():
+            return 0
+
+        new_rows = frame[keep]
+        columns = {"Date": days[keep].astype("<i8")}
+        for name in FIELDS:
+            columns[name] = new_rows[name].to_numpy(dtype="<f8")
+        for name, values in columns.items():
+            path = self._column_path(symbol, name, meta["generation"])
+            # Drop any tail left by an append that crashed before meta was updated
+            if os.path.exists(path):
+                expected = meta["rows"] * values.itemsize
+                if os.path.getsize(path) != expected:
+                    with open(path, "r+b") as f:
+                        f.truncate(expected)
+            with open(path, "ab") as f:
+                values.tofile(f)
+
+        meta["rows"] += int(keep.sum())
+        self.appended_rows += int(keep.sum())
+        return int(keep.sum())
+
+    def _replace(self, symbol, meta, frame):
+        """Writes frame as a fresh generation; meta points at it once the caller writes meta"""
+        previous = meta["generation"]
+        meta["generation"] = previous + 1
+        meta["rows"] = 0
+        for name in ("Date",) + FIELDS:
+            path = self._column_path(symbol, name, meta["generation"])
+            if os.path.exists(path):
+                os.remove(path)
+        return self._append(symbol, meta, frame), previous
+
+    def _remove_generation(self, symbol, generation):
+        for name in ("Date",) + FIELDS:
+            try:
+                os.remove(self._column_path(symbol, name, generation))
+            except OSError:
+                pass
+
+    def sync(self, symbol, fetcher, period, live=None):
+        """Brings the store up to date for `period` (at most one delta fetch per day) and returns the bars written.
+
+        fetcher(start=None, period=None) returns daily bars from `start` (a date, inclusive) onward, or the last
+        `period` of bars. Only `period` is ever backfilled; a later request for a longer range backfills again.
+        `live` is a recent frame the caller already has, checked against the store without another request.
+        Only completed bars are stored, today's in-progress bar is left to the live fetch.
+        """
+        today = datetime.datetime.utcnow().date()
+        # A bar dated today (or yesterday in UTC terms for markets ahead of UTC) may still be trading
+        cutoff = np.datetime64(today - datetime.timedelta(days=1), "D")
+        meta = self._read_meta(symbol)
+        stored_days = PERIOD_DAYS.get(meta["backfillPeriod"], 0)
+
+        backfill = None
+        if not meta["rows"]:
+            backfill = period
+        elif stored_days < PERIOD_DAYS[period]:
+            backfill = period
+        elif self._basis_changed(symbol, meta, live):
+            backfill = meta["backfillPeriod"]
+        elif meta["lastSync"] == today.isoformat():
+            self.skipped_syncs += 1
+            return 0
+
+        frame = None
+        if backfill is None:
+            last = np.datetime64(int(self._map(symbol, "Date", "<i8", meta)[-1]), "D")
+            if last + np.timedelta64(1, "D") < cutoff:
+                # From the last stored day on, so its bar can be compared with what Yahoo has for it now
+                frame = fetcher(start=last.item())
+                self.delta_syncs += 1
+                if self._basis_changed(symbol, meta, frame):
+                    backfill = meta["backfillPeriod"]
+        if backfill is not None:
+            if meta["rows"] and backfill == meta["backfillPeriod"]:
+                logger.info("Price history of %s was re-based (split or dividend), backfilling again", symbol)
+                self.rebases += 1
+            frame = fetcher(period=backfill)
+            self.backfills += 1
+
+        completed = None
+        if frame is not None and not frame.empty:
+            completed = frame[(day_keys(frame.index) < cutoff) & frame["Close"].notna().to_numpy()]
+            if completed.empty:
+                completed = None
+        if backfill is not None and completed is None:
+            # Nothing came back: keep what is stored, and don't leave files behind for unknown symbols
+            return 0
+
+        with self._locked(symbol):
+            meta = self._read_meta(symbol)
+            previous = None
+            written = 0
+            if backfill is not None:
+                written, previous = self._replace(symbol, meta, completed)
+                if PERIOD_DAYS.get(backfill, 0) >= PERIOD_DAYS.get(meta["backfillPeriod"], 0):
+                    meta["backfillPeriod"] = backfill
+            elif completed is not None:
+                written = self._append(symbol, meta, completed)
+            meta["lastSync"] = today.isoformat()
+            self._write_meta(symbol, meta)
+            if previous is not None:
+                self._remove_generation(symbol, previous)
+        return written
+
+    def stats(self):
+        try:
+            symbols = len([d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d))])
+        except OSError:
+            symbols = 0
+        return {
+            "root": self.root,
+            "symbols": symbols,
+            "backfills": self.backfills,
+            "rebases": self.rebases,
+            "deltaSyncs": self.delta_syncs,
+            "skippedSyncs": self.skipped_syncs,
+            "appendedRows": self.appended_rows,
+        }
@@ -0,0 +1,143 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", 2))
+PASSWORD_QUEUE_SIZE = int(os.getenv("PASSWORD_QUEUE_SIZE", 16))  # Hashes allowed to wait behind the busy workers
+PASSWORD_TIMEOUT = float(os.getenv("PASSWORD_TIMEOUT", 10))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+logger = logging.getLogger(__name__)
+
+_context = None
+
+
+def _pwd_context():
+    # Built once per worker process
+    global _context
+    if _context is None:
+        from passlib.context import CryptContext
+        # Using bcrypt with rounds=12 to prevent the "password too long" error
+        _context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+    return _context
+
+
+def _hash_password(password):
+    started = time.time()
+    return _pwd_context().hash(password), started, time.time() - started
+
+
+def _verify_password(plain_password, hashed_password):
+    started = time.time()
+    try:
+        # Truncate password to 72 bytes max for bcrypt
+        password_bytes = plain_password.encode('utf-8')
+        if len(password_bytes) > 72:
+            password_bytes = password_bytes[:72]
+            plain_password = password_bytes.decode('utf-8', errors='ignore')
+        valid = _pwd_context().verify(plain_password, hashed_password)
+    except Exception as e:
+        logger.warning("Password verification error: %s", e)
+        valid = False
+    return valid, started, time.time() - started
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the hashing queue is full or a hash did not finish in time"""
+
+
+class PasswordHasher:
+    """bcrypt on a small process pool with a bounded queue, so auth bursts can't starve the API threads"""
+
+    def __init__(self, workers=PASSWORD_WORKERS, queue_size=PASSWORD_QUEUE_SIZE, timeout=PASSWORD_TIMEOUT):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._queue_waits = deque(maxlen=500)
+        self._hash_times = deque(maxlen=500)
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the API process already runs threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def _release(self, future=None):
+        # A slot stays taken until the worker is done with it, not until the caller stops waiting
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy("Too many authentication requests, try again shortly")
+
+        submitted = time.time()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        try:
+            result, started, elapsed = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # A hash still queued is dropped; one already running keeps its slot until the callback frees it
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise PasswordPoolBusy("Authentication is taking too long, try again shortly")
+        with self._lock:
+            self.completed += 1
+            self._queue_waits.append(max(0.0, started - submitted))
+            self._hash_times.append(elapsed)
+        return result
+
+    def hash(self, password):
+        return self._run(_hash_password, password)
+
+    def verify(self, plain_password, hashed_password):
+        return self._run(_verify_password, plain_password, hashed_password)
+
+    @staticmethod
+    def _summary(samples):
+        if not samples:
+            return {"count": 0, "p50Ms": None, "p95Ms": None, "maxMs": None}
+        ordered = sorted(samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+        return {"count": len(ordered), "p50Ms": pick(0.5), "p95Ms": pick(0.95), "maxMs": round(ordered[-1] * 1000, 1)}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queueSize": self.queue_size,
+                "inFlight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timedOut": self.timed_out,
+                "queueWait": self._summary(self._queue_waits),
+                "hashLatency": self._summary(self._hash_times),
+            }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
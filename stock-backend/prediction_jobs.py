@@ -0,0 +1,126 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from ml_engine import build_prediction
+
+logger = logging.getLogger(__name__)
+
+# Every gunicorn worker has its own pool, so by default they split the cores between them
+PREDICTION_WORKERS = int(os.getenv(
+    "PREDICTION_WORKERS", max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY", 1))))
+))
+PREDICTION_JOB_TTL = int(os.getenv("PREDICTION_JOB_TTL", 600))  # Seconds a finished job stays pollable
+
+
+class PredictionJobs:
+    """Runs predictions in a process pool; clients poll job status instead of holding a request open.
+
+    Job records (status, result, error) and the symbol -> running job map live in the shared ephemeral store
+    with a TTL, so any gunicorn worker can answer a poll and a symbol is only predicted once at a time across
+    all of them. Training itself runs in the pool of the worker that took the request.
+    """
+
+    def __init__(self, inputs_loader, store, max_workers=PREDICTION_WORKERS, job_ttl=PREDICTION_JOB_TTL):
+        # inputs_loader(symbol) -> (hist, indicators), both are shipped to the worker process
+        self.inputs_loader = inputs_loader
+        self.store = store
+        self.max_workers = max_workers
+        self.job_ttl = job_ttl
+        self._lock = threading.Lock()
+        self._processes = None
+        # Fetching history is I/O, it runs on threads that then hand training to the process pool
+        self._threads = ThreadPoolExecutor(max_workers=max_workers * 2, thread_name_prefix="predict-job")
+        self.running = 0
+        self.finished = {"DONE": 0, "FAILED": 0}
+        self.deduplicated = 0
+
+    @staticmethod
+    def _job_key(job_id):
+        return f"predict-job:{job_id}"
+
+    @staticmethod
+    def _symbol_key(symbol):
+        return f"predict-symbol:{symbol}"
+
+    def _process_pool(self):
+        with self._lock:
+            if self._processes is None:
+                # spawn, not fork: the API process already runs threads (alerts, email outbox)
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._processes
+
+    def _save(self, job):
+        self.store.set(self._job_key(job["jobId"]), json.dumps(job), self.job_ttl)
+
+    def submit(self, symbol):
+        symbol = symbol.upper()
+        job = {
+            "jobId": uuid.uuid4().hex,
+            "symbol": symbol,
+            "status": "QUEUED",
+            "createdAt": time.time(),
+            "finishedAt": None,
+            "result": None,
+            "error": None,
+        }
+        # The record goes first, so a worker that loses the race below can always read the job it defers to
+        self._save(job)
+        if not self.store.add(self._symbol_key(symbol), job["jobId"], self.job_ttl):
+            existing = self.get(self.store.get(self._symbol_key(symbol)) or "")
+            if existing is not None and existing["status"] in ("QUEUED", "RUNNING"):
+                self.store.delete(self._job_key(job["jobId"]))
+                with self._lock:
+                    self.deduplicated += 1
+                return existing
+            # That job finished a moment ago and its owner is about to release the symbol; just run this one
+        self._process_pool()
+        with self._lock:
+            self.running += 1
+        self._threads.submit(self._run, job)
+        return dict(job)
+
+    def _run(self, job):
+        try:
+            hist, indicators = self.inputs_loader(job["symbol"])
+            if hist is None or hist.empty:
+                raise ValueError("Not enough data to predict")
+            job["status"] = "RUNNING"
+            self._save(job)
+            result = self._process_pool().submit(build_prediction, job["symbol"], hist, indicators).result()
+            job.update(status="DONE", result=result)
+        except Exception as e:
+            job.update(status="FAILED", error=str(e))
+        job["finishedAt"] = time.time()
+        try:
+            self._save(job)
+            if self.store.get(self._symbol_key(job["symbol"])) == job["jobId"]:
+                self.store.delete(self._symbol_key(job["symbol"]))
+        except Exception:
+            logger.exception("Could not store prediction job %s", job["jobId"])
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.finished[job["status"]] += 1
+
+    def get(self, job_id):
+        value = self.store.get(self._job_key(job_id))
+        return json.loads(value) if value else None
+
+    def stats(self):
+        # This worker's share; the job records themselves are in the shared store
+        with self._lock:
+            return {"workers": self.max_workers, "running": self.running, "finished": dict(self.finished),
+                    "deduplicated": self.deduplicated}
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False)
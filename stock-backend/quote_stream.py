@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteStreamHub:
+    """One poller fetches every subscribed symbol once per tick and fans each changed quote out to its subscribers"""
+
+    def __init__(self, fetch_quotes, interval=15.0, queue_size=100, ignore_fields=("time",)):
+        # fetch_quotes(symbols) -> {symbol: quote dict}; blocking, it runs in the default executor
+        self.fetch_quotes = fetch_quotes
+        self.interval = interval
+        self.queue_size = queue_size
+        # Fields that differ on every tick (a timestamp) and don't make a quote "changed" on their own
+        self.ignore_fields = set(ignore_fields)
+        self._subscribers = {}  # symbol -> set of asyncio.Queue
+        self._latest = {}
+        self._task = None
+        self.ticks = 0
+        self.messages = 0
+        self.unchanged = 0
+        self.dropped = 0
+
+    def subscribe(self, symbols):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        for symbol in symbols:
+            self._subscribers.setdefault(symbol, set()).add(queue)
+            # New clients get the last known quote right away instead of waiting a tick
+            if symbol in self._latest:
+                self._offer(queue, self._latest[symbol])
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._poll())
+        return queue
+
+    def unsubscribe(self, queue, symbols):
+        for symbol in symbols:
+            queues = self._subscribers.get(symbol)
+            if queues is None:
+                continue
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[symbol]
+                self._latest.pop(symbol, None)
+
+    def _changed(self, symbol, quote):
+        previous = self._latest.get(symbol)
+        if previous is None:
+            return True
+        return any(previous.get(k) != v for k, v in quote.items() if k not in self.ignore_fields)
+
+    def _offer(self, queue, quote):
+        if queue.full():
+            # Slow consumer: drop its oldest update, it only needs the newest price
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(quote)
+
+    async def _poll(self):
+        loop = asyncio.get_event_loop()
+        while self._subscribers:
+            started = time.monotonic()
+            symbols = list(self._subscribers)
+            try:
+                quotes = await loop.run_in_executor(None, self.fetch_quotes, symbols)
+            except Exception as e:
+                logger.warning("Quote stream poll failed for %d symbols: %s", len(symbols), e)
+                quotes = {}
+            self.ticks += 1
+
+            for symbol, quote in quotes.items():
+                queues = self._subscribers.get(symbol)
+                if not queues:
+                    continue
+                if not self._changed(symbol, quote):
+                    self.unchanged += 1
+                    continue
+                self._latest[symbol] = quote
+                for queue in list(queues):
+                    self._offer(queue, quote)
+                    self.messages += 1
+            await asyncio.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+    def stats(self):
+        return {
+            "symbols": len(self._subscribers),
+            "subscriptions": sum(len(q) for q in self._subscribers.values()),
+            "ticks": self.ticks,
+            "messages": self.messages,
+            "unchanged": self.unchanged,
+            "dropped": self.dropped,
+            "polling": self._task is not None and not self._task.done(),
+        }
@@ -0,0 +1,96 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from upstream_http import http_session
+
+logger = logging.getLogger(__name__)
+
+BULK_FETCH_CONCURRENCY = int(os.getenv("BULK_FETCH_CONCURRENCY", 8))
+CORRELATION_MIN_OVERLAP = 20  # Shared daily returns a pair needs before its correlation is reported
+_bulk_executor = ThreadPoolExecutor(max_workers=BULK_FETCH_CONCURRENCY, thread_name_prefix="bulk-history")
+
+
+def fetch_history(symbol, period="5d", interval="1d"):
+    """One symbol's bars over the shared keep-alive session, or None when Yahoo has none"""
+    frame = yf.Ticker(symbol, session=http_session()).history(period=period, interval=interval)
+    return None if frame is None or frame.empty else frame
+
+
+def download_bulk_history(symbols, period="5d", interval="1d", fetch=fetch_history):
+    """History for many symbols, returns {symbol: frame}; symbols without data or whose fetch failed are left out.
+
+    This is not one upstream round trip: Yahoo's chart API takes one symbol per request (the pinned yfinance's
+    download() just loops over it, and shares one global result dict between concurrent calls). So it is N
+    requests, run in parallel on a bounded pool over the shared keep-alive session. fetch(symbol, period,
+    interval) -> frame or None does one of them.
+    """
+    if not symbols:
+        return {}
+
+    futures = {symbol: _bulk_executor.submit(fetch, symbol, period, interval) for symbol in symbols}
+    frames = {}
+    for symbol, future in futures.items():
+        try:
+            frame = future.result()
+        except Exception as e:
+            logger.info("History fetch failed for %s: %s", symbol, e)
+            continue
+        if frame is not None and not frame.empty:
+            frames[symbol] = frame
+    return frames
+
+
+def latest_changes(closes: pd.DataFrame) -> pd.DataFrame:
+    """Last price, previous close, change and changePercent for every column of an aligned close frame.
+
+    Symbols from different exchanges leave NaN gaps on each other's holidays, so the
+    last and previous valid rows are located per column with one pass over the array.
+    """
+    columns = ["price", "prevClose", "change", "changePercent"]
+    if closes.empty:
+        return pd.DataFrame(columns=columns, index=closes.columns, dtype=float)
+
+    values = closes.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    rows = np.arange(values.shape[0])[:, None]
+    cols = np.arange(values.shape[1])
+
+    last_idx = np.where(valid, rows, -1).max(axis=0)
+    prev_idx = np.where(valid & (rows < last_idx), rows, -1).max(axis=0)
+
+    price = np.where(last_idx >= 0, values[np.maximum(last_idx, 0), cols], np.nan)
+    # With a single bar there is no previous close, report zero change like get_quote does
+    prev_close = np.where(prev_idx >= 0, values[np.maximum(prev_idx, 0), cols], price)
+    change = price - prev_close
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_percent = np.where(prev_close != 0, change / prev_close * 100, 0.0)
+
+    return pd.DataFrame(
+        {"price": price, "prevClose": prev_close, "change": change, "changePercent": change_percent},
+        index=closes.columns,
+    )
+
+
+def returns_correlation(closes: pd.DataFrame, min_overlap: int = CORRELATION_MIN_OVERLAP):
+    """Pearson correlation of daily returns for every pair of columns, and how many days each pair shares.
+
+    Pairwise-complete: each pair uses the dates both columns have a return for, so one short-history or recently
+    listed symbol only thins its own pairs. Pairs sharing fewer than min_overlap returns are NaN.
+    Returns (matrix, overlap) as numpy arrays.
+    """
+    n = closes.shape[1]
+    if closes.empty:
+        return np.full((n, n), np.nan), np.zeros((n, n), dtype=int)
+    # Each column's returns over its own trading days, so another exchange's holidays don't punch extra gaps
+    returns = pd.DataFrame({name: column.dropna().pct_change() for name, column in closes.items()},
+                           columns=closes.columns)
+    returns = returns.replace([np.inf, -np.inf], np.nan)
+    valid = returns.notna().to_numpy(dtype=int)
+    overlap = valid.T @ valid
+    matrix = returns.corr(min_periods=max(2, min_overlap)).to_numpy(dtype=float)
+    return matrix, overlap
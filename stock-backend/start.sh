@@ -26,8 +26,11 @@ ls -la /tmp
 
 # Run database migrations
 echo "Running database migrations..."
-python -c "from database import Base, engine; Base.metadata.create_all(bind=engine)"
+python -c "import models; from database import Base, engine; Base.metadata.create_all(bind=engine)"
 
-# Start the application using uvicorn
+# Tables were just created above, workers don't need to repeat it
+export CREATE_TABLES_ON_STARTUP=${CREATE_TABLES_ON_STARTUP:-0}
+
+# Start the application: gunicorn imports the app once and forks uvicorn workers (see gunicorn.conf.py)
 echo "Starting FastAPI application..."
-exec uvicorn main:app --host 0.0.0.0 --port $PORT
\ No newline at end of file
+exec gunicorn main:app -c gunicorn.conf.py
\ No newline at end of file
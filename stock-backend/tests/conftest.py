@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules live at the top of stock-backend and read their settings at import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "tests")
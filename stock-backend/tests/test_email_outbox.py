@@ -0,0 +1,165 @@
+import datetime
+import socket
+import ssl
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from email_outbox import OutboxSender, enqueue_email
+
+SENDERS = 3
+EMAILS = 12
+
+
+def _self_signed_context(tmp_path):
+    # The sender always upgrades with STARTTLS, so the sink needs a certificate
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.utcnow()
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256()))
+    cert_path, key_path = tmp_path / "cert.pem", tmp_path / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+class Sink:
+    def __init__(self):
+        self.subjects = []
+        self._lock = threading.Lock()
+
+    def record(self, subject):
+        with self._lock:
+            self.subjects.append(subject)
+
+    async def handle_DATA(self, server, session, envelope):
+        subject = next(line for line in envelope.content.decode().splitlines() if line.startswith("Subject: "))
+        self.record(subject[len("Subject: "):])
+        return "250 OK"
+
+
+class FakeSMTP:
+    """Stands in for the smtplib.SMTP connection OutboxSender opens"""
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    def send_message(self, msg):
+        self.sink.record(msg["Subject"])
+
+    def noop(self):
+        return 250, b"OK"
+
+    def quit(self):
+        pass
+
+
+class FakeConnectionSender(OutboxSender):
+    def __init__(self, sink, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sink = sink
+
+    def _connect(self):
+        self.connections_opened += 1
+        return FakeSMTP(self.sink)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_sink(tmp_path):
+    aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+    aiosmtpd_smtp = pytest.importorskip("aiosmtpd.smtp")
+    sink = Sink()
+    port = _free_port()
+    controller = aiosmtpd_controller.Controller(
+        sink, hostname="127.0.0.1", port=port,
+        tls_context=_self_signed_context(tmp_path),
+        authenticator=lambda *args: aiosmtpd_smtp.AuthResult(success=True),
+        auth_require_tls=True,
+    )
+    controller.start()
+    yield sink, port
+    controller.stop()
+
+
+def _outbox(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}", connect_args={"timeout": 30})
+    models.EmailOutbox.__table__.create(engine)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    for i in range(EMAILS):
+        enqueue_email(db, "user@example.com", f"message {i}", "body")
+    db.close()
+    return session_factory
+
+
+def _drain_together(senders):
+    barrier = threading.Barrier(len(senders))
+    errors = []
+
+    def drain(sender):
+        try:
+            barrier.wait()
+            sender.process_batch()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            sender._close()
+
+    threads = [threading.Thread(target=drain, args=(sender,)) for sender in senders]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def _assert_sent_once(session_factory, sink, senders):
+    assert sorted(sink.subjects) == sorted(f"message {i}" for i in range(EMAILS))
+    assert sum(sender.sent for sender in senders) == EMAILS
+    db = session_factory()
+    assert {row.status for row in db.query(models.EmailOutbox)} == {"SENT"}
+    db.close()
+
+
+def test_concurrent_senders_claim_each_row_once(tmp_path):
+    session_factory = _outbox(tmp_path)
+    sink = Sink()
+    senders = [FakeConnectionSender(sink, session_factory, "smtp.invalid", 587, "app@example.com", "secret",
+                                    batch_size=EMAILS)
+               for _ in range(SENDERS)]
+
+    _drain_together(senders)
+
+    _assert_sent_once(session_factory, sink, senders)
+
+
+def test_each_email_reaches_a_real_smtp_server_once(tmp_path, smtp_sink):
+    # End to end over STARTTLS and AUTH; needs aiosmtpd from requirements-dev.txt
+    sink, port = smtp_sink
+    session_factory = _outbox(tmp_path)
+    senders = [OutboxSender(session_factory, "127.0.0.1", port, "app@example.com", "secret", batch_size=EMAILS)
+               for _ in range(SENDERS)]
+
+    _drain_together(senders)
+
+    _assert_sent_once(session_factory, sink, senders)
@@ -0,0 +1,71 @@
+import threading
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from ephemeral_store import DBStore, MemoryStore
+
+WORKERS = 8
+
+
+def _worker_store(path):
+    # One engine per "worker", as each gunicorn worker would have its own pool
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 30})
+    return DBStore(sessionmaker(bind=engine), sweep_interval=3600)
+
+
+def _run_together(fn):
+    barrier = threading.Barrier(WORKERS)
+    results = [None] * WORKERS
+    errors = []
+
+    def run(i):
+        try:
+            barrier.wait()
+            results[i] = fn(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    return results
+
+
+def test_token_is_redeemed_once_across_workers(tmp_path):
+    path = tmp_path / "kv.db"
+    models.EphemeralEntry.__table__.create(create_engine(f"sqlite:///{path}"))
+    stores = [_worker_store(path) for _ in range(WORKERS)]
+    stores[0].set("reset:token", "user@example.com", ttl=60)
+
+    redeemed = _run_together(lambda i: stores[i].pop("reset:token"))
+
+    assert redeemed.count("user@example.com") == 1
+    assert redeemed.count(None) == WORKERS - 1
+    assert stores[0].get("reset:token") is None
+
+
+def test_concurrent_sets_of_one_key_upsert(tmp_path):
+    path = tmp_path / "kv.db"
+    models.EphemeralEntry.__table__.create(create_engine(f"sqlite:///{path}"))
+    stores = [_worker_store(path) for _ in range(WORKERS)]
+
+    _run_together(lambda i: stores[i].set("reset:token", f"value-{i}", ttl=60))
+
+    assert stores[0].get("reset:token") in {f"value-{i}" for i in range(WORKERS)}
+
+
+def test_add_only_sets_missing_or_expired_keys(tmp_path):
+    path = tmp_path / "kv.db"
+    models.EphemeralEntry.__table__.create(create_engine(f"sqlite:///{path}"))
+    for store in (MemoryStore(), _worker_store(path)):
+        assert store.add("job", "first", ttl=60)
+        assert not store.add("job", "second", ttl=60)
+        assert store.get("job") == "first"
+        store.set("lease", "old", ttl=-1)
+        assert store.add("lease", "new", ttl=60)
+        assert store.get("lease") == "new"
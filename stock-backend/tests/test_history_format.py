@@ -0,0 +1,37 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from history_format import history_columns, history_rows, price_points
+
+
+def _hist():
+    index = pd.date_range("2024-01-01", periods=3, freq="D", name="Date")
+    return pd.DataFrame({
+        "Open": [10.0, np.nan, 12.0],
+        "High": [11.0, np.nan, 13.0],
+        "Low": [9.0, np.nan, 11.0],
+        "Close": [10.5, np.nan, 12.5],
+        "Volume": [100, 200, 300],
+        "SMA_20": [np.nan, np.nan, 11.0],
+        "SMA_50": [np.nan, np.nan, np.nan],
+    }, index=index)
+
+
+def test_columns_map_nan_to_none():
+    data = history_columns(_hist())
+    json.dumps(data, allow_nan=False)  # What JSONResponse does
+    assert data["open"] == [10.0, None, 12.0]
+    assert data["close"] == [10.5, None, 12.5]
+    assert data["volume"] == [100, 200, 300]
+    assert data["sma20"] == [0.0, 0.0, 11.0]
+
+
+def test_rows_and_points_map_nan_to_none():
+    rows = history_rows(_hist())
+    points = price_points(_hist())
+    json.dumps(rows, allow_nan=False)
+    json.dumps(points, allow_nan=False)
+    assert rows[1]["open"] is None and rows[1]["close"] is None
+    assert points[1] == {"date": "2024-01-02", "price": None}
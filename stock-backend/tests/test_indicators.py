@@ -0,0 +1,80 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from indicators import RSI_WINDOW, SMA_WINDOWS, IndicatorEngine, stamp_fetched
+
+
+def _frame(closes, start="2024-01-01"):
+    return pd.DataFrame({"Close": np.asarray(closes, dtype=float)},
+                        index=pd.date_range(start, periods=len(closes), freq="D", name="Date"))
+
+
+def _random_walk(n, seed=7):
+    return 100 + np.random.default_rng(seed).normal(0, 1.5, n).cumsum()
+
+
+def _wilder_rsi(close):
+    """Reference RSI: the first average is the plain mean of RSI_WINDOW moves, the rest are Wilder-smoothed"""
+    delta = close.diff()
+    averages = []
+    for moves in (delta.clip(lower=0), (-delta).clip(lower=0)):
+        seeded = moves.iloc[RSI_WINDOW:].copy()
+        seeded.iloc[0] = moves.iloc[1:RSI_WINDOW + 1].mean()
+        averages.append(seeded.ewm(alpha=1 / RSI_WINDOW, adjust=False).mean())
+    avg_gain, avg_loss = averages
+    return (100 - 100 / (1 + avg_gain / avg_loss)).reindex(close.index)
+
+
+def _assert_matches_pandas(engine, symbol, hist):
+    for w in SMA_WINDOWS:
+        np.testing.assert_allclose(engine.sma(symbol, hist.index, w), hist["Close"].rolling(w).mean().to_numpy())
+    np.testing.assert_allclose(engine.latest(symbol)["rsi"], _wilder_rsi(hist["Close"]).iloc[-1])
+
+
+def test_age_follows_the_fetch_not_the_sync():
+    engine = IndicatorEngine()
+    three_hours_ago = time.time() - 3 * 3600
+    cached = stamp_fetched(_frame(np.linspace(100, 160, 60)), three_hours_ago)
+
+    engine.sync("AAPL", cached)
+    engine.sync("AAPL", cached.copy())  # The same old cache entry, synced again
+    assert engine.latest("AAPL")["ageSeconds"] >= 3 * 3600 - 1
+
+    live = stamp_fetched(cached.iloc[-1:].assign(Close=170.0))
+    engine.sync("AAPL", live)
+    assert engine.latest("AAPL")["ageSeconds"] < 60
+    assert engine.latest("AAPL")["close"] == 170.0
+
+    # An older frame must not roll the live close back
+    engine.sync("AAPL", cached.copy())
+    assert engine.latest("AAPL")["close"] == 170.0
+
+
+def test_unstamped_frame_has_no_age():
+    engine = IndicatorEngine()
+    engine.sync("MSFT", _frame(np.linspace(10, 20, 30)))
+    assert engine.latest("MSFT")["ageSeconds"] is None
+
+
+def test_sma_and_rsi_match_pandas():
+    engine = IndicatorEngine()
+    hist = _frame(_random_walk(120))
+    engine.sync("AAPL", hist)
+    _assert_matches_pandas(engine, "AAPL", hist)
+    # Not just the last value: the whole series, from the first bar that has an RSI
+    state = engine.sync("AAPL", hist)
+    np.testing.assert_allclose(state.rsi[RSI_WINDOW:], _wilder_rsi(hist["Close"]).to_numpy()[RSI_WINDOW:])
+    assert np.isnan(state.rsi[:RSI_WINDOW]).all()
+
+
+def test_values_still_match_pandas_after_appending_a_bar():
+    engine = IndicatorEngine()
+    closes = _random_walk(121)
+    engine.sync("AAPL", _frame(closes[:120]))
+
+    # The next day's frame: yesterday's bar again plus the new one, folded in without a rebuild
+    engine.sync("AAPL", _frame(closes[119:], start="2024-04-29"))
+    assert engine.stats() == {"symbols": 1, "rebuilds": 1, "appendedBars": 1}
+    _assert_matches_pandas(engine, "AAPL", _frame(closes))
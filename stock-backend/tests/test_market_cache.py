@@ -0,0 +1,21 @@
+import time
+
+from market_cache import TTLCache
+
+
+def test_ttl_cache_is_bounded_and_expires():
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.put("A", 1)
+    cache.put("B", 2)
+    assert cache.get("A") == 1  # A is now the most recently used
+    cache.put("C", 3)
+    assert len(cache) == 2
+    assert cache.get("B") is None
+    assert cache.get("A") == 1 and cache.get("C") == 3
+
+    short = TTLCache(ttl=0.01, max_entries=10)
+    short.put("A", 1)
+    time.sleep(0.02)
+    short.put("B", 2)  # Inserting drops the expired head
+    assert len(short) == 1
+    assert short.get("A") is None
@@ -0,0 +1,83 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from ohlcv_store import OHLCVStore
+
+DAYS = 40
+
+
+class FakeYahoo:
+    """Daily bars for the last DAYS days, up to today; fetch() has the fetcher signature OHLCVStore.sync expects"""
+
+    def __init__(self):
+        today = datetime.datetime.utcnow().date()
+        self.index = pd.date_range(today - datetime.timedelta(days=DAYS - 1), periods=DAYS, freq="D", name="Date")
+        self.close = np.linspace(100.0, 100.0 + DAYS - 1, DAYS)
+        self.upto = DAYS  # How many of the bars exist yet
+        self.calls = []
+
+    def frame(self):
+        close = self.close[:self.upto]
+        return pd.DataFrame({"Open": close, "High": close + 1, "Low": close - 1, "Close": close,
+                             "Volume": np.full(len(close), 1000, dtype="int64")}, index=self.index[:self.upto])
+
+    def fetch(self, start=None, period=None):
+        self.calls.append({"start": start, "period": period})
+        frame = self.frame()
+        return frame if start is None else frame[frame.index >= pd.Timestamp(start)]
+
+
+def _assert_stored(store, symbol, expected):
+    pd.testing.assert_frame_equal(store.read(symbol), expected, check_index_type=False, check_freq=False)
+
+
+def _synced_yesterday(store, symbol):
+    # The store syncs at most once a day; make its last sync yesterday's
+    meta = store._read_meta(symbol)
+    meta["lastSync"] = (datetime.datetime.utcnow().date() - datetime.timedelta(days=1)).isoformat()
+    store._write_meta(symbol, meta)
+
+
+def _backfilled_a_week_ago(tmp_path):
+    store, yahoo = OHLCVStore(root=str(tmp_path)), FakeYahoo()
+    yahoo.upto = DAYS - 6
+    store.sync("AAPL", yahoo.fetch, "1mo")
+    _assert_stored(store, "AAPL", yahoo.frame())
+    _synced_yesterday(store, "AAPL")
+    yahoo.upto = DAYS
+    return store, yahoo
+
+
+def test_delta_sync_appends_the_new_bars(tmp_path):
+    store, yahoo = _backfilled_a_week_ago(tmp_path)
+    generation = store._read_meta("AAPL")["generation"]
+
+    # Everything after the last stored day, except yesterday's and today's bars, which may still change
+    assert store.sync("AAPL", yahoo.fetch, "1mo") == 4
+    assert yahoo.calls[-1] == {"start": yahoo.index[DAYS - 7].date(), "period": None}
+    _assert_stored(store, "AAPL", yahoo.frame().iloc[:-2])
+    stats = store.stats()
+    assert (stats["backfills"], stats["deltaSyncs"], stats["rebases"]) == (1, 1, 0)
+    assert store._read_meta("AAPL")["generation"] == generation
+
+
+def test_split_rebases_into_a_new_generation(tmp_path):
+    store, yahoo = _backfilled_a_week_ago(tmp_path)
+    generation = store._read_meta("AAPL")["generation"]
+    old_close = tmp_path / "AAPL" / f"Close.{generation}.bin"
+    assert old_close.exists()
+
+    # A 2:1 split: Yahoo now reports every past close halved
+    yahoo.close = yahoo.close / 2
+    store.sync("AAPL", yahoo.fetch, "1mo")
+
+    assert yahoo.calls[-2]["start"] is not None  # The delta fetch noticed the changed close...
+    assert yahoo.calls[-1] == {"start": None, "period": "1mo"}  # ...and the whole period was fetched again
+    _assert_stored(store, "AAPL", yahoo.frame().iloc[:-2])
+    stats = store.stats()
+    assert (stats["backfills"], stats["rebases"]) == (2, 1)
+    assert store._read_meta("AAPL")["generation"] == generation + 1
+    assert not old_close.exists()
+    assert (tmp_path / "AAPL" / f"Close.{generation + 1}.bin").exists()
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from ephemeral_store import DBStore
+from prediction_jobs import PredictionJobs
+
+
+def _wait_finished(jobs, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(job_id)
+        if job["status"] in ("DONE", "FAILED"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_jobs_are_shared_between_workers(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'kv.db'}", connect_args={"timeout": 30})
+    models.EphemeralEntry.__table__.create(engine)
+    release = threading.Event()
+
+    def blocked_loader(symbol):
+        release.wait(5)
+        return None, None
+
+    # Two gunicorn workers: same database, separate PredictionJobs
+    first = PredictionJobs(blocked_loader, DBStore(sessionmaker(bind=engine)), max_workers=1)
+    second = PredictionJobs(blocked_loader, DBStore(sessionmaker(bind=engine)), max_workers=1)
+    try:
+        job = first.submit("aapl")
+        assert second.get(job["jobId"])["status"] == "QUEUED"
+        # The symbol is already being predicted on the other worker
+        assert second.submit("AAPL")["jobId"] == job["jobId"]
+        assert second.stats()["deduplicated"] == 1
+
+        release.set()
+        finished = _wait_finished(second, job["jobId"])
+        assert finished["status"] == "FAILED"
+        assert finished["error"] == "Not enough data to predict"
+
+        # Once it finished the symbol can be predicted again, from either worker
+        assert second.submit("AAPL")["jobId"] != job["jobId"]
+    finally:
+        release.set()
+        first.shutdown()
+        second.shutdown()
+
+
+def test_unknown_job_is_missing(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'kv.db'}")
+    models.EphemeralEntry.__table__.create(engine)
+    jobs = PredictionJobs(lambda symbol: (None, None), DBStore(sessionmaker(bind=engine)), max_workers=1)
+    try:
+        assert jobs.get("nope") is None
+    finally:
+        jobs.shutdown()
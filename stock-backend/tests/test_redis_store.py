@@ -0,0 +1,192 @@
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from ephemeral_store import RedisError, RedisStore
+
+CLIENTS = 8
+
+
+class RespStub(socketserver.ThreadingTCPServer):
+    """Just enough of the Redis protocol for RedisStore: AUTH, SELECT, SET [NX] [PX], GET, DEL, MULTI/EXEC, DBSIZE.
+
+    drop_after_exec closes the connection after running an EXEC but before replying to it.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password=None):
+        super().__init__(("127.0.0.1", 0), RespHandler)
+        self.password = password
+        self.data = {}
+        self.lock = threading.Lock()
+        self.connections = []
+        self.execs = 0
+        self.drop_after_exec = False
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f"redis://:{self.password}@{host}:{port}/0" if self.password else f"redis://{host}:{port}/0"
+
+    def drop_connections(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.shutdown(socket.SHUT_RDWR)
+                conn.close()
+            self.connections.clear()
+
+    def run(self, args):
+        name = args[0].upper()
+        with self.lock:
+            if name == "SET":
+                key, value, options = args[1], args[2], [a.upper() for a in args[3:]]
+                if "NX" in options and key in self.data:
+                    return None
+                self.data[key] = value
+                return "+OK"
+            if name == "GET":
+                return self.data.get(args[1])
+            if name == "DEL":
+                return 1 if self.data.pop(args[1], None) is not None else 0
+            if name == "DBSIZE":
+                return len(self.data)
+        return "+OK"
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def _reply(self, value):
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, int):
+            return f":{value}\r\n".encode()
+        if isinstance(value, list):
+            return f"*{len(value)}\r\n".encode() + b"".join(self._reply(v) for v in value)
+        if value.startswith(("+", "-")):
+            return value.encode() + b"\r\n"
+        data = value.encode()
+        return f"${len(data)}\r\n".encode() + data + b"\r\n"
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections.append(self.connection)
+        authed = server.password is None
+        queued = None
+        while True:
+            try:
+                args = self._read_command()
+            except (OSError, ValueError):
+                return
+            if args is None:
+                return
+            name = args[0].upper()
+            if name == "AUTH":
+                authed = args[1] == server.password
+                reply = "+OK" if authed else "-WRONGPASS invalid password"
+            elif not authed:
+                reply = "-NOAUTH Authentication required."
+            elif name == "MULTI":
+                queued, reply = [], "+OK"
+            elif name == "EXEC":
+                with server.lock:
+                    server.execs += 1
+                reply = [server.run(command) for command in queued]
+                queued = None
+                if server.drop_after_exec:
+                    self.connection.close()
+                    return
+            elif queued is not None:
+                queued.append(args)
+                reply = "+QUEUED"
+            else:
+                reply = server.run(args)
+            try:
+                self.wfile.write(self._reply(reply))
+            except OSError:
+                return
+
+
+@pytest.fixture
+def stub():
+    server = RespStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_pop_redeems_once_across_clients(stub):
+    stores = [RedisStore(stub.url) for _ in range(CLIENTS)]
+    stores[0].set("reset:token", "user@example.com", ttl=60)
+    barrier = threading.Barrier(CLIENTS)
+    results = [None] * CLIENTS
+
+    def redeem(i):
+        barrier.wait()
+        results[i] = stores[i].pop("reset:token")
+
+    threads = [threading.Thread(target=redeem, args=(i,)) for i in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count("user@example.com") == 1
+    assert results.count(None) == CLIENTS - 1
+
+
+def test_pop_is_not_retried_when_the_reply_is_lost(stub):
+    store = RedisStore(stub.url)
+    store.set("reset:token", "user@example.com", ttl=60)
+    stub.drop_after_exec = True
+
+    with pytest.raises((OSError, ConnectionError)):
+        store.pop("reset:token")
+
+    assert stub.execs == 1
+    assert "reset:token" not in stub.data
+    stub.drop_after_exec = False
+    assert store.pop("reset:token") is None
+
+
+def test_reconnects_after_the_server_drops_the_connection(stub):
+    store = RedisStore(stub.url)
+    store.set("key", "value", ttl=60)
+    stub.drop_connections()
+    time.sleep(0.05)
+
+    assert store.get("key") == "value"
+    assert store.reconnects == 2
+
+
+def test_failed_auth_leaves_no_connection_behind():
+    server = RespStub(password="right")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        host, port = server.server_address
+        store = RedisStore(f"redis://:wrong@{host}:{port}/0")
+        with pytest.raises(RedisError):
+            store.get("key")
+        assert store._sock is None
+        # The next call authenticates again instead of reusing the unauthenticated socket
+        with pytest.raises(RedisError, match="WRONGPASS"):
+            store.get("key")
+    finally:
+        server.shutdown()
+        server.server_close()
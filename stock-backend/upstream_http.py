@@ -0,0 +1,299 @@
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 4))  # Distinct hosts kept in the pool
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 32))  # Keep-alive connections per host
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 5.0))  # Per request, and never more than the call's budget has left
+UPSTREAM_ATTEMPTS = int(os.getenv("UPSTREAM_ATTEMPTS", 3))
+UPSTREAM_RETRY_BUDGET = float(os.getenv("UPSTREAM_RETRY_BUDGET", 4.0))  # Seconds for all attempts and waits
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", 0.2))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", 1.5))
+BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", 5))
+SYMBOL_BREAKER_FAILURES = int(os.getenv("SYMBOL_BREAKER_FAILURES", 2))
+BREAKER_RESET_SECONDS = float(os.getenv("UPSTREAM_BREAKER_RESET", 30))
+SYMBOL_BREAKERS_MAX = int(os.getenv("SYMBOL_BREAKERS_MAX", 2048))
+
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Referer': 'https://finance.yahoo.com/',
+}
+
+
+# --- Shared session ---
+_session = None
+_session_lock = threading.Lock()
+# Deadline of the UpstreamClient.call running on this thread; the session caps each request's timeout to it
+_deadline = contextvars.ContextVar("upstream_deadline", default=None)
+
+
+def request_timeout():
+    deadline = _deadline.get()
+    if deadline is None:
+        return HTTP_TIMEOUT
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.exceptions.Timeout("upstream time budget spent")
+    return min(HTTP_TIMEOUT, remaining)
+
+
+class TimeoutSession(requests.Session):
+    """A Session whose requests get request_timeout() unless they pass their own; yfinance never passes one"""
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = request_timeout()
+        return super().request(method, url, **kwargs)
+
+
+def create_session(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE):
+    session = TimeoutSession()
+    session.headers.update(BROWSER_HEADERS)
+    # Retries are ours (with backoff and breakers), the adapter only pools connections
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def http_session():
+    """The process-wide keep-alive session handed to yfinance; created on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def _reset_after_fork():
+    # Pooled sockets must not be shared between gunicorn workers; each child opens its own
+    global _session, _session_lock
+    _session = None
+    _session_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# --- Circuit breakers ---
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures; after `reset_timeout` one trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+        self.short_circuited = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self._trial:
+                self._trial = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def release(self):
+        # An admitted call that never ran hands its trial slot back
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures, "shortCircuited": self.short_circuited}
+
+
+class BreakerSet:
+    """Per-key breakers, least recently used keys are forgotten past `max_keys`"""
+
+    def __init__(self, failure_threshold, reset_timeout, max_keys=SYMBOL_BREAKERS_MAX):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_keys = max_keys
+        self._breakers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                if len(self._breakers) > self.max_keys:
+                    self._breakers.popitem(last=False)
+            else:
+                self._breakers.move_to_end(key)
+            return breaker
+
+    def stats(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {
+            "tracked": len(breakers),
+            "open": sum(1 for b in breakers if b.state != "closed"),
+            "shortCircuited": sum(b.short_circuited for b in breakers),
+        }
+
+
+# --- Retries ---
+def backoff_delay(attempt, base=UPSTREAM_BACKOFF_BASE, cap=UPSTREAM_BACKOFF_MAX):
+    """Full jitter: uniform in [0, min(cap, base * 2^attempt)], so clients that failed together retry apart"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _stale_connection(error):
+    # A pooled keep-alive connection the server already closed; a fresh one will likely work right away
+    return (isinstance(error, requests.exceptions.ConnectionError)
+            and not isinstance(error, requests.exceptions.Timeout))
+
+
+class UpstreamClient:
+    """Calls one upstream behind an upstream-wide breaker and a breaker per key (symbol), with every request's
+    timeout capped to the call's time budget.
+
+    fn returning None means "no data for this key": it isn't retried and only counts against the key. A transport
+    error (a requests exception: timeout, refused or dropped connection, bad response) counts against both; any
+    other exception (yfinance failing to parse a page, say) is raised without touching the breakers. Open breakers
+    raise CircuitOpen without calling fn. key=None skips the per-key breaker.
+
+    Request threads must not sleep, so by default a failed attempt is only retried straight away when its pooled
+    connection had gone stale. backoff=True (background threads only) retries up to `attempts` times with jittered
+    exponential waits, all inside the budget.
+    """
+
+    def __init__(self, name, attempts=UPSTREAM_ATTEMPTS, budget=UPSTREAM_RETRY_BUDGET,
+                 failure_threshold=BREAKER_FAILURES, key_failure_threshold=SYMBOL_BREAKER_FAILURES,
+                 reset_timeout=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.attempts = attempts
+        self.budget = budget
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.keys = BreakerSet(key_failure_threshold, reset_timeout)
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _admit(self, key):
+        key_breaker = self.keys.get(key) if key is not None else None
+        if key_breaker is not None and not key_breaker.allow():
+            raise CircuitOpen(f"{self.name} circuit for {key} is open")
+        if not self.breaker.allow():
+            if key_breaker is not None:
+                key_breaker.release()
+            raise CircuitOpen(f"{self.name} circuit is open")
+        self.calls += 1
+        return key_breaker
+
+    def _settle(self, key_breaker, result, error):
+        if error is not None:
+            if not isinstance(error, requests.exceptions.RequestException):
+                # Not the upstream's fault; release a half-open trial slot without a verdict
+                self.breaker.release()
+                if key_breaker is not None:
+                    key_breaker.release()
+                return
+            self.failures += 1
+            self.breaker.record_failure()
+            if key_breaker is not None:
+                key_breaker.record_failure()
+            return
+        # A reply, even an empty one, means the upstream itself is up
+        self.breaker.record_success()
+        if key_breaker is None:
+            return
+        if result is None:
+            self.failures += 1
+            key_breaker.record_failure()
+        else:
+            key_breaker.record_success()
+
+    def _retry_delay(self, error, attempt, deadline, backoff):
+        # None when the error should be raised: no attempt left, no time left, or not worth an immediate retry
+        if attempt + 1 >= self.attempts or not isinstance(error, requests.exceptions.RequestException):
+            return None
+        if not backoff:
+            return 0.0 if attempt == 0 and _stale_connection(error) else None
+        delay = backoff_delay(attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def call(self, key, fn, *args, backoff=False):
+        key_breaker = self._admit(key)
+        deadline = time.monotonic() + self.budget
+        token = _deadline.set(deadline)
+        try:
+            attempt = 0
+            while True:
+                try:
+                    result = fn(*args)
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt, deadline, backoff)
+                    if delay is None:
+                        self._settle(key_breaker, None, e)
+                        raise
+                    logger.info("%s attempt %d for %s failed, retrying in %.2fs: %s",
+                                self.name, attempt + 1, key, delay, e)
+                    self.retries += 1
+                    attempt += 1
+                    if delay:
+                        time.sleep(delay)
+                    continue
+                self._settle(key_breaker, result, None)
+                return result
+        finally:
+            _deadline.reset(token)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "breaker": self.breaker.stats(),
+            "keys": self.keys.stats(),
+        }
@@ -2,11 +2,14 @@ import { useEffect, useState, useRef } from "react";
 import { useSearchParams } from "react-router-dom";
 import { 
   fetchQuote, 
+  fetchQuotes, 
   fetchHistory, 
   fetchPrediction, 
   addToWatchlist, 
   fetchStockNews, 
-  createAlert 
+  createAlert,
+  updateUserProfile,
+  clearAuthTokens
 } from "../services/api"; 
 import SearchBar from "../components/SearchBar";
 import StatsCards from "../components/StatsCards";
@@ -50,6 +53,7 @@ function Dashboard() {
   // --- HANDLERS ---
   const handleLogout = () => {
     localStorage.removeItem("user");
+    clearAuthTokens();
     setUser(null);
     setShowProfileMenu(false);
   };
@@ -65,23 +69,17 @@ function Dashboard() {
 
   const handleUpdateProfile = async () => {
     try {
-      const response = await fetch(`http://localhost:8000/api/auth/profile/${user.id}`, {
-        method: "PUT",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          full_name: editName,
-          email: editEmail,
-          password: editPassword || null 
-        }),
+      const { data } = await updateUserProfile(user.id, {
+        full_name: editName,
+        email: editEmail,
+        password: editPassword || null 
       });
-      const data = await response.json();
-      if (!response.ok) throw new Error(data.detail || "Update failed");
       const updatedUser = { ...user, ...data.user };
       localStorage.setItem("user", JSON.stringify(updatedUser));
       setUser(updatedUser);
       alert("✅ Profile Updated Successfully!");
       setShowEditModal(false);
-    } catch (err) { alert("❌ Error: " + err.message); }
+    } catch (err) { alert("❌ Error: " + (err.response?.data?.detail || err.message)); }
   };
 
   const handleSetAlert = async () => {
@@ -151,21 +149,17 @@ function Dashboard() {
       const indices = ["^NSEI", "^BSESN", "BTC-USD"]; 
       const niceNames = { "^NSEI": "NIFTY 50", "^BSESN": "SENSEX", "BTC-USD": "BITCOIN" };
 
+      // All tiles priced by one batch request; a symbol the backend couldn't price shows as zero
+      const quotesRes = await fetchQuotes(indices);
+      const quotes = indices.map((idx, i) => {
+        const q = quotesRes.data[i];
+        return q && !q.error ? q : { symbol: idx, price: 0, change: 0, changePercent: 0 };
+      });
+
       if (isSilent) {
-        // Sequential calls to avoid overwhelming backend
-        const results = [];
-        for (const idx of indices) {
-          try {
-            const res = await fetchQuote(idx);
-            results.push(res);
-          } catch (e) {
-            console.error(`Failed to fetch ${idx}:`, e);
-            results.push({ data: { price: 0, change: 0, changePercent: 0 } });
-          }
-        }
         setMarketIndices(prevIndices => {
             return prevIndices.map((prevItem, index) => {
-                const newData = results[index].data;
+                const newData = quotes[index];
                 return {
                     ...prevItem, 
                     price: newData.price,
@@ -175,15 +169,14 @@ function Dashboard() {
             });
         });
       } else {
-        // Sequential calls with delay for initial load
+        // Sequential history calls with delay for initial load
         const results = [];
         for (let i = 0; i < indices.length; i++) {
           const idx = indices[i];
           try {
-            const quoteRes = await fetchQuote(idx);
             const historyRes = await fetchHistory(idx, "1mo"); 
             results.push({ 
-                ...quoteRes.data, 
+                ...quotes[i], 
                 history: historyRes.data || [], 
                 displayName: niceNames[idx] || idx 
             });
@@ -191,10 +184,7 @@ function Dashboard() {
             if (i < indices.length - 1) await new Promise(resolve => setTimeout(resolve, 200));
           } catch (e) {
             console.error(`Failed to fetch ${idx}:`, e);
-            results.push({ 
-                price: 0, change: 0, changePercent: 0, 
-                history: [], displayName: niceNames[idx] || idx 
-            });
+            results.push({ ...quotes[i], history: [], displayName: niceNames[idx] || idx });
           }
         }
         setMarketIndices(results);
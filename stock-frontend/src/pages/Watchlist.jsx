@@ -1,5 +1,5 @@
-import { useEffect, useState } from "react";
-import { getWatchlist, removeFromWatchlist, fetchQuote } from "../services/api"; 
+import { useCallback, useEffect, useState } from "react";
+import { getWatchlist, removeFromWatchlist, fetchQuotes } from "../services/api"; 
 import { useNavigate } from "react-router-dom";
 import "./Watchlist.css";
 
@@ -10,31 +10,28 @@ function Watchlist() {
   
   const user = JSON.parse(localStorage.getItem("user"));
 
+  // Prices every holding with one batch request; a holding without a price keeps its previous values
+  const priceHoldings = async (items) => {
+    const res = await fetchQuotes([...new Set(items.map((item) => item.symbol))]);
+    const quotes = Object.fromEntries(res.data.filter((q) => !q.error).map((q) => [q.symbol, q]));
+    return items.map((item) => {
+      const quote = quotes[item.symbol.toUpperCase()];
+      if (!quote) return { currentPrice: 0, profit: 0, profitPercent: 0, currentValue: 0, ...item };
+      const currentPrice = quote.price;
+      const currentValue = currentPrice * item.quantity;
+      const investedValue = item.buy_price * item.quantity;
+      const profit = currentValue - investedValue;
+      const profitPercent = (profit / investedValue) * 100;
+      return { ...item, currentPrice, profit, profitPercent, currentValue };
+    });
+  };
+
   // Function to refresh stock prices
   const refreshPrices = useCallback(async () => {
     if (!user || !watchlist.length) return;
     
     try {
-      // Sequential calls to avoid overwhelming backend
-      const updatedItems = [];
-      for (const item of watchlist) {
-        try {
-          const quoteRes = await fetchQuote(item.symbol);
-          const currentPrice = quoteRes.data.price;
-          const currentValue = currentPrice * item.quantity;
-          const investedValue = item.buy_price * item.quantity;
-          const profit = currentValue - investedValue;
-          const profitPercent = (profit / investedValue) * 100;
-          updatedItems.push({ ...item, currentPrice, profit, profitPercent, currentValue });
-          // Add small delay between requests
-          await new Promise(resolve => setTimeout(resolve, 100));
-        } catch (error) {
-          console.error(`Error updating price for ${item.symbol}:`, error);
-          updatedItems.push(item); // Return the item unchanged if there's an error
-        }
-      }
-      
-      setWatchlist(updatedItems);
+      setWatchlist(await priceHoldings(watchlist));
     } catch (err) {
       console.error("Error refreshing prices:", err);
     }
@@ -64,27 +61,7 @@ function Watchlist() {
       const res = await getWatchlist(user.id);
       const items = res.data;
 
-      // Sequential calls to avoid overwhelming backend
-      const updatedItems = [];
-      for (const item of items) {
-        try {
-            const quoteRes = await fetchQuote(item.symbol);
-            const currentPrice = quoteRes.data.price;
-            
-            const currentValue = currentPrice * item.quantity;
-            const investedValue = item.buy_price * item.quantity;
-            const profit = currentValue - investedValue;
-            const profitPercent = (profit / investedValue) * 100;
-
-            updatedItems.push({ ...item, currentPrice, profit, profitPercent, currentValue });
-            // Add small delay between requests
-            await new Promise(resolve => setTimeout(resolve, 100));
-        } catch (error) {
-            updatedItems.push({ ...item, currentPrice: 0, profit: 0, profitPercent: 0, currentValue: 0 });
-        }
-      }
-
-      setWatchlist(updatedItems);
+      setWatchlist(items.length ? await priceHoldings(items) : []);
     } catch (err) {
       console.error("Error loading portfolio:", err);
     } finally {
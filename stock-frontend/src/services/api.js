@@ -3,10 +3,46 @@ const api = axios.create({
   baseURL: import.meta.env.VITE_API_URL || 'https://stock-market-26i6.onrender.com/api',
 });
 
+// --- Auth tokens ---
+const TOKENS_KEY = 'tokens';
+
+export const setAuthTokens = (data) => {
+  if (data?.access_token) {
+    localStorage.setItem(TOKENS_KEY, JSON.stringify({ access: data.access_token, refresh: data.refresh_token }));
+  }
+};
+export const clearAuthTokens = () => localStorage.removeItem(TOKENS_KEY);
+const getAuthTokens = () => JSON.parse(localStorage.getItem(TOKENS_KEY) || 'null');
+
+api.interceptors.request.use((config) => {
+  const tokens = getAuthTokens();
+  if (tokens?.access) config.headers.Authorization = `Bearer ${tokens.access}`;
+  return config;
+});
+
+// An expired access token is refreshed once, then the original request is retried
+api.interceptors.response.use(null, async (error) => {
+  const original = error.config;
+  const tokens = getAuthTokens();
+  if (error.response?.status !== 401 || !tokens?.refresh || original._retried || original.url === '/auth/refresh') {
+    throw error;
+  }
+  original._retried = true;
+  try {
+    const { data } = await api.post('/auth/refresh', { refresh_token: tokens.refresh });
+    setAuthTokens(data);
+  } catch (refreshError) {
+    clearAuthTokens();
+    throw error;
+  }
+  return api(original);
+});
+
 export const fetchQuote = (symbol) => api.get("/stocks/quote", { params: { symbol } });
+export const fetchQuotes = (symbols) => api.get("/stocks/quotes", { params: { symbols: symbols.join(",") } });
 export const fetchHistory = (symbol, range = "6mo") => api.get("/stocks/history", { params: { symbol, range } });
 export const fetchPrediction = (symbol) => api.get("/stocks/predict", { params: { symbol } });
-export const loginUser = (credentials) => api.post("/auth/login", credentials);
+export const loginUser = (credentials) => api.post("/auth/login", credentials).then((res) => { setAuthTokens(res.data); return res; });
 export const registerUser = (userData) => api.post("/auth/register", userData);
 
 // Watchlist
@@ -18,7 +54,7 @@ export const removeFromWatchlist = (userId, symbol) => api.delete(`/watchlist/${
 export const fetchStockNews = (symbol) => api.get(`/stocks/news?symbol=${symbol}`);
 
 // User Profile
-export const updateUserProfile = (userId, userData) => api.put(`/auth/profile/${userId}`, userData);
+export const updateUserProfile = (userId, userData) => api.put(`/auth/profile/${userId}`, userData).then((res) => { setAuthTokens(res.data); return res; });
 
 // Alerts (ADDED THIS)
 export const createAlert = (data) => api.post("/alerts/create", data);